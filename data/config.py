@@ -20,6 +20,86 @@ DB_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB
 
 
 ECHO = os.getenv('ECHO', 'False').lower() in ('true', '1', 't')
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', '200'))  # порог лога медленных запросов, мс
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))  # 0 - не запускать /metrics
+
+# Пакетная запись активности пользователей
+ACTIVITY_BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', '200'))  # строк в одном INSERT
+ACTIVITY_FLUSH_MS = int(os.getenv('ACTIVITY_FLUSH_MS', '2000'))  # максимальная задержка записи, мс
+ACTIVITY_QUEUE_MAX = int(os.getenv('ACTIVITY_QUEUE_MAX', '20000'))  # предел очереди в памяти
+
+# Партиции costumer_activity
+ACTIVITY_PARTITIONS_AHEAD = int(os.getenv('ACTIVITY_PARTITIONS_AHEAD', '2'))  # месяцев вперед
+ACTIVITY_RETENTION_MONTHS = int(os.getenv('ACTIVITY_RETENTION_MONTHS', '12'))  # 0 - хранить всё
+ACTIVITY_RETENTION_MODE = os.getenv('ACTIVITY_RETENTION_MODE', 'drop')  # drop | detach (архив)
+
+# Режим получения апдейтов: polling | webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')  # внешний https адрес за обратным прокси
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '1'))  # процессов на одном порту (SO_REUSEPORT)
+
+# Апдейты разных чатов обрабатываются параллельно (не больше UPDATE_CONCURRENCY),
+# апдейты одного чата - строго по очереди; 0 - стандартное поведение aiogram
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '64'))
+
+# Хранилище FSM: memory - в памяти процесса, postgres - общая таблица fsm_storage
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory').lower()
+FSM_TTL = int(os.getenv('FSM_TTL', str(7 * 24 * 3600)))  # время жизни состояния без активности, с
+
+# Служебные данные пользователей (id сообщений, результаты поиска)
+USER_STORE_TTL = int(os.getenv('USER_STORE_TTL', str(24 * 3600)))  # с после последней записи
+USER_STORE_MAX = int(os.getenv('USER_STORE_MAX', '10000'))  # пользователей в памяти на хранилище
+
+# Окно объединения нажатий +/- по позиции корзины/заказа, мс
+QUANTITY_COALESCE_MS = int(os.getenv('QUANTITY_COALESCE_MS', '700'))
+
+# Ограничение частоты апдейтов (token bucket), формат 'rate/burst' - в секунду / подряд.
+# Корзины в памяти процесса: при WEBHOOK_WORKERS > 1 лимиты действуют в каждом процессе отдельно
+THROTTLE_DEFAULT = os.getenv('THROTTLE_DEFAULT', '3/6')  # на пользователя и действие
+THROTTLE_RULES = os.getenv(
+    'THROTTLE_RULES',
+    'CartItem_plus=4/8,CartItem_minus=4/8,OrderItem_plus=4/8,OrderItem_minus=4/8,'
+    'catalog_continue=1/3,catalog_skip=1/3,add_to_cart=2/5,add_to_order=2/5,message=2/5'
+)  # префикс callback=rate/burst через запятую, 'message' - сообщения
+THROTTLE_GLOBAL = os.getenv('THROTTLE_GLOBAL', '30/60')  # на весь процесс
+THROTTLE_USERS_MAX = int(os.getenv('THROTTLE_USERS_MAX', '10000'))  # корзин в памяти на правило
+
+# Ограничение частоты запросов бота к Telegram, формат 'rate/burst' - в секунду / подряд.
+# Корзины в памяти процесса: общий лимит делится поровну между WEBHOOK_WORKERS процессами,
+# лимиты чатов действуют в каждом процессе отдельно
+BOT_RATE_GLOBAL = os.getenv('BOT_RATE_GLOBAL', '30/30')  # на весь бот
+BOT_RATE_PRIVATE = os.getenv('BOT_RATE_PRIVATE', '1/6')  # на личный чат
+BOT_RATE_GROUP = os.getenv('BOT_RATE_GROUP', '0.33/20')  # на группу/канал (20 в минуту)
+BOT_RATE_RETRIES = int(os.getenv('BOT_RATE_RETRIES', '3'))  # повторов после ответа retry_after
+
+# Популярные поисковые запросы (Space-Saving)
+SEARCH_TOPK_CAPACITY = int(os.getenv('SEARCH_TOPK_CAPACITY', '500'))  # запросов в памяти на счетчик
+SEARCH_STATS_FLUSH_MIN = int(os.getenv('SEARCH_STATS_FLUSH_MIN', '5'))  # период записи в БД, мин
+
+# Проверка ссылок на картинки товаров перед отправкой карточки
+IMAGE_CHECK_TIMEOUT = float(os.getenv('IMAGE_CHECK_TIMEOUT', '3'))  # таймаут запроса, с
+IMAGE_CHECK_TTL = int(os.getenv('IMAGE_CHECK_TTL', str(24 * 3600)))  # срок годности результата, с
+IMAGE_CHECK_CACHE_MAX = int(os.getenv('IMAGE_CHECK_CACHE_MAX', '20000'))  # ссылок в памяти процесса
+
+# Вид страницы каталога и поиска: album - альбом до 10 фото и одно сообщение с кнопками,
+# cards - отдельная карточка с кнопками на каждый товар, carousel - одно сообщение, листание ◀/▶
+CATALOG_VIEW = os.getenv('CATALOG_VIEW', 'album').lower()
+
+# Готовые тексты и клавиатуры карточек товаров в памяти
+CARD_CACHE_MAX = int(os.getenv('CARD_CACHE_MAX', '5000'))  # карточек
+
+# Предзагрузка картинок товаров в служебный чат для кэша file_id
+PREWARM_CHAT_ID = int(os.getenv('PREWARM_CHAT_ID', '0'))  # закрытый чат/канал с ботом; 0 - выключено
+# Telegram пропускает в группу/канал около 20 сообщений в минуту: порция при 0.3/с
+# занимает ~8 минут и успевает закончиться до следующего запуска
+PREWARM_RATE = float(os.getenv('PREWARM_RATE', '0.3'))  # картинок в секунду
+PREWARM_BATCH = int(os.getenv('PREWARM_BATCH', '150'))  # картинок за один запуск
+PREWARM_INTERVAL_MIN = int(os.getenv('PREWARM_INTERVAL_MIN', '10'))  # период запуска, мин
 
 MAIL_HOST = os.getenv('MAIL_HOST')
 MAIL_USER = os.getenv('MAIL_USER')
@@ -8,6 +8,7 @@ It creates a database engine, creates all tables in database and provides a sess
 It also provides a function for saving user data to database.
 
 """
+import json
 import os
 import re
 from datetime import datetime
@@ -24,15 +25,18 @@ from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import Session, DeclarativeBase
-from sqlalchemy.pool import QueuePool
 from sqlalchemy.util import ellipses_string
 
 from data.config import DB_URL
-from database.models import Base, Costumer, Product, Category, Question, News, Cart, CartItems, OrderItems
+from database.instrumentation import InstrumentedQueuePool, setup_instrumentation
+from database.migrations import upgrade_schema, PRODUCT_JSON_COLUMNS
+from database.models import Base, Costumer, Product, Category, Question, News, Cart, CartItems, OrderItems, \
+    ProductImage
+from services.invalidation import notify_invalidation
 from services.search import normalize_text
 
 engine = create_engine(DB_URL,
-                       poolclass=QueuePool,
+                       poolclass=InstrumentedQueuePool,  # QueuePool + время ожидания соединения
                        pool_size=5,  # минимальное количество соединений
                        max_overflow=10,  # максимальное количество соединений
                        pool_timeout=30,  # тайм-аут ожидания (сек)
@@ -56,7 +60,9 @@ engine = create_engine(DB_URL,
                            'isolation_level': 'READ COMMITTED'
                        }
                        )
+setup_instrumentation(engine)  # метрики запросов, пула и лог медленных запросов
 Base.metadata.create_all(engine)
+upgrade_schema(engine)
 session = Session(engine)
 connect = engine.connect()
 
@@ -185,6 +191,46 @@ def get_product_description(session: Session, product_id: int) -> Product:
     return product
 
 
+def get_products_by_attributes(session: Session, attributes: dict, category_id: int = None,
+                               in_stock: bool = False):
+    """
+    Fetches products whose characteristics contain all given attributes.
+
+    Uses the JSONB containment operator (@>) backed by the GIN index on
+    Product.characteristics, e.g. {"Страна производства": "Норвегия"}.
+
+    :param session: SQLAlchemy session for database operations
+    :param attributes: Dict of characteristic name -> value to match
+    :param category_id: Optional ID of the category to filter products by
+    :param in_stock: Boolean value indicating whether to filter products by stock
+    :return: List of Product objects matching the attributes
+    """
+    stmt = select(Product).where(Product.characteristics.contains(attributes))
+    if category_id is not None:
+        stmt = stmt.where(Product.category_id == category_id)
+    if in_stock:
+        stmt = stmt.where(Product.ostatok > 0.05)
+    result = session.scalars(stmt.order_by(Product.id)).all()
+    return result
+
+
+def get_attribute_values(session: Session, name: str, category_id: int = None) -> list[str]:
+    """
+    Fetches distinct values of a characteristic, e.g. all countries for "Страна производства".
+
+    :param session: SQLAlchemy session for database operations
+    :param name: Characteristic name
+    :param category_id: Optional ID of the category to filter products by
+    :return: Sorted list of distinct values
+    """
+    value = Product.characteristics[name].astext
+    stmt = select(value).distinct().where(Product.characteristics.has_key(name))
+    if category_id is not None:
+        stmt = stmt.where(Product.category_id == category_id)
+    result = session.scalars(stmt.order_by(value)).all()
+    return result
+
+
 def get_product_by_article(session: Session, article: str):
     """Выборка товара по его артиклю"""
     product = session.query(Product).filter(Product.article == article).first()
@@ -332,6 +378,7 @@ def set_admin(session: Session, admin_tg_id: int, to_delete: bool):
         admin.is_admin = False
     else:
         admin.is_admin = True
+    notify_invalidation(session, "admin", admin_tg_id)
     # session.commit()
 
 
@@ -449,17 +496,17 @@ def get_entity_items(session: Session, cart_id: int, model):
 
 
 def change_item_quantity(session: Session, item_id: int, delta: int, model):
-    """Изменяет количество товара CartItems, OrderItems"""
-    stmt = select(model).where(model.id == item_id)
-    item = session.execute(stmt).scalar_one_or_none()
-
-    if not item:
-        return None
-
-    item.quantity = max(1, item.quantity + delta)
+    """Изменяет количество товара CartItems, OrderItems на delta (не меньше 1) одним UPDATE.
+    Возвращает строку (product_id, quantity, unit_price) или None, если позиции нет"""
+    stmt = (
+        update(model)
+        .where(model.id == item_id)
+        .values(quantity=func.greatest(1, model.quantity + delta))
+        .returning(model.product_id, model.quantity, model.unit_price)
+    )
+    row = session.execute(stmt).one_or_none()
     session.commit()
-    session.refresh(item)
-    return item
+    return row
 
 
 def delete_entity_item(session: Session, item_id: int, model):
@@ -557,6 +604,21 @@ def get_entity_by_user_id(session: Session, user_id: int, model):
 # endregoin
 
 
+def parse_json_field(value):
+    """Приводит значение JSON колонки из файла (строка) к dict/list для JSONB.
+    Строка, которая не является JSON (например, список ссылок через запятую),
+    сохраняется как JSON строка, чтобы данные не терялись"""
+    if not isinstance(value, str):
+        return value
+    if not value.strip():
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        logger.warning(f"Значение не в формате JSON, сохранено строкой: {value[:50]}")
+        return value
+
+
 def load_data(file_name: str, engine: Engine) -> int:
     """Загрузка новых товаров обновление товаров в БД"""
     try:
@@ -569,6 +631,11 @@ def load_data(file_name: str, engine: Engine) -> int:
         # 2. NaN -> None
         df = df.where(pd.notnull(df), None)
 
+        # JSON строки из файла -> dict/list для JSONB колонок
+        for column in PRODUCT_JSON_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].apply(parse_json_field)
+
         if df.empty:
             logger.exception(f"Файл %s пуст {file_name}")
             return 0
@@ -607,6 +674,7 @@ def load_data(file_name: str, engine: Engine) -> int:
 
         with engine.begin() as conn:
             conn.execute(insert(products), rows)
+            notify_invalidation(conn, "product")
 
         logger.info(f"Загружено {len(df_new)} новых товаров, пропущено {len(df_duplicates)} дублей")
 
@@ -639,6 +707,7 @@ def delete_product_by_id(session: Session, product_id: int) -> bool:
     if not product:
         return False
     session.delete(product)
+    notify_invalidation(session, "product", product_id)
     # session.commit()
     return True
 
@@ -647,13 +716,20 @@ def delete_product_by_id(session: Session, product_id: int) -> bool:
 # Analitics
 # ********************
 
+# Сырые события не выгружаются целиком - для отчетов есть агрегаты activity_daily_*,
+# бинарные HyperLogLog скетчи в Excel не нужны
+EXPORT_EXCLUDED_TABLES = {"costumer_activity", "activity_hll", "fsm_storage", "image_checks", "product_images"}
+
+
 def get_all_tables_names():
     """Динамическое получение всех моделей БД для формирования выгрузок"""
-    return Base.metadata.tables.keys()
+    return [name for name in Base.metadata.tables.keys() if name not in EXPORT_EXCLUDED_TABLES]
 
 
 def clean_excel_string(s: str) -> str:
-    """Удаляет неподдерживаемые Excel символы из строки."""
+    """Удаляет неподдерживаемые Excel символы из строки, JSONB значения сериализует в строку."""
+    if isinstance(s, (dict, list)):
+        s = json.dumps(s, ensure_ascii=False)
     if not isinstance(s, str):
         return s
     # Убираем все control characters кроме \t и \n
@@ -695,6 +771,8 @@ def entity_to_excel(entity):
     df = pd.DataFrame([entity_dict])
     for col in df.select_dtypes(include=['datetime64[ns, UTC]']).columns:  # Убирает тайм зону из столбцов с датами.
         df[col] = df[col].dt.tz_localize(None)
+    for col in df.select_dtypes(include=['object']).columns:
+        df[col] = df[col].apply(clean_excel_string)
     file_name = f"data/Инфа_{entity_dict.get('article')}.xlsx"
     df.to_excel(file_name, index=False)
     return file_name
@@ -718,6 +796,9 @@ def update_prooduct_field(session: Session, product_id, field, value):
             product.description = value
         case "image":
             product.main_image = value
+            # Закэшированный file_id относится к старой картинке
+            session.execute(delete(ProductImage).where(ProductImage.product_id == product_id))
         case _:
             raise ValueError("Неизвестное поле")
+    notify_invalidation(session, "product", product_id)
     #session.commit()
@@ -0,0 +1,106 @@
+"""
+Модуль database.instrumentation
+
+Инструментирование SQLAlchemy: длительность каждого запроса, число запросов
+на один апдейт бота, ожидание соединения из пула и лог медленных запросов
+с именем хендлера. Агрегаты доступны как гистограммы services.metrics.
+"""
+import time
+from contextvars import ContextVar
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from data.config import SLOW_QUERY_MS
+from services.metrics import Histogram, Counter, Gauge
+
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+db_query_seconds = Histogram("shefport_db_query_seconds", "SQL statement duration", ("handler",), QUERY_BUCKETS)
+db_slow_queries = Counter("shefport_db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("handler",))
+db_pool_checkout_seconds = Histogram("shefport_db_pool_checkout_seconds", "Wait for a pooled connection",
+                                     buckets=QUERY_BUCKETS)
+db_queries_per_update = Histogram("shefport_db_queries_per_update", "SQL statements per handled update",
+                                  ("handler",), COUNT_BUCKETS)
+db_time_per_update = Histogram("shefport_db_time_per_update_seconds", "Total SQL time per handled update",
+                               ("handler",), QUERY_BUCKETS)
+
+
+class UpdateStats:
+    """Счетчики запросов одного апдейта"""
+    __slots__ = ("handler", "queries", "db_time")
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_current_update: ContextVar[UpdateStats | None] = ContextVar("current_update", default=None)
+
+
+def start_update(handler: str):
+    """Начинает учет запросов апдейта, возвращает токен для finish_update"""
+    return _current_update.set(UpdateStats(handler))
+
+
+def finish_update(token) -> None:
+    """Фиксирует число и время запросов апдейта в гистограммах"""
+    stats = _current_update.get()
+    _current_update.reset(token)
+    if stats is None:
+        return
+    db_queries_per_update.observe(stats.queries, stats.handler)
+    db_time_per_update.observe(stats.db_time, stats.handler)
+
+
+def current_handler() -> str:
+    stats = _current_update.get()
+    return stats.handler if stats else "background"
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, измеряющий ожидание свободного соединения"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    handler = current_handler()
+    db_query_seconds.observe(elapsed, handler)
+    stats = _current_update.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(handler)
+        logger.warning(f"Медленный запрос {elapsed * 1000:.0f} мс в '{handler}': {' '.join(statement.split())[:500]}")
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def setup_instrumentation(engine: Engine) -> None:
+    """Подключает обработчики событий к engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    pool = engine.pool
+    Gauge("shefport_db_pool_checked_out", "Connections currently checked out", func=pool.checkedout)
+    Gauge("shefport_db_pool_overflow", "Current pool overflow", func=pool.overflow)
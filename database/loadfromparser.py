@@ -7,6 +7,7 @@
 """
 import json
 from database.models import Product, Category
+from services.invalidation import notify_invalidation
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 
@@ -45,11 +46,6 @@ def import_data_to_database(session: Session, data: Dict[str, Any]):
         # Импортируем товары
         print("Импорт товаров...")
         for product_data in data['products']:
-            # Преобразуем словари в JSON строки
-            characteristics_json = json.dumps(product_data.get('characteristics', {}), ensure_ascii=False)
-            additional_images_json = json.dumps(product_data.get('additional_images', []), ensure_ascii=False)
-            nutrition_facts_json = json.dumps(product_data.get('nutrition_facts', {}), ensure_ascii=False)
-
             # Получаем ID категории
             category_id = category_url_to_id.get(product_data['category_url'])
 
@@ -68,17 +64,18 @@ def import_data_to_database(session: Session, data: Dict[str, Any]):
                 article=product_data.get('article'),
                 description=product_data.get('description'),
                 full_description=product_data.get('full_description'),
-                characteristics=characteristics_json,
+                characteristics=product_data.get('characteristics', {}),
                 main_image=product_data.get('main_image'),
-                additional_images=additional_images_json,
+                additional_images=product_data.get('additional_images', []),
                 weight=product_data.get('weight'),
                 calories=product_data.get('calories'),
-                nutrition_facts=nutrition_facts_json,
+                nutrition_facts=product_data.get('nutrition_facts', {}),
                 category_id=category_id
             )
             sess.add(product)
 
         # Сохраняем изменения
+        notify_invalidation(sess, "category")
         sess.commit()
         print("Данные успешно импортированы!")
 
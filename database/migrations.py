@@ -0,0 +1,71 @@
+"""
+Модуль database.migrations
+
+Приведение схемы существующей БД к актуальным моделям.
+
+``Base.metadata.create_all`` создает только отсутствующие таблицы и не меняет
+уже существующие, поэтому изменения колонок в старых таблицах выполняются
+здесь. Все шаги идемпотентны и безопасны при повторном запуске.
+"""
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from data.config import ACTIVITY_PARTITIONS_AHEAD
+from database.partitions import migrate_activity_to_partitioned, ensure_activity_partitions
+
+# Колонки products, которые раньше хранились как JSON строка в Text
+PRODUCT_JSON_COLUMNS = ("characteristics", "additional_images", "nutrition_facts")
+
+# GIN индексы (jsonb_path_ops) для фильтрации по атрибутам через @>
+PRODUCT_GIN_INDEXES = {
+    "ix_products_characteristics": "characteristics",
+    "ix_products_nutrition_facts": "nutrition_facts",
+}
+
+
+def _column_type(conn, table: str, column: str):
+    """Возвращает data_type колонки из information_schema или None"""
+    stmt = text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = :table AND column_name = :column"
+    )
+    return conn.execute(stmt, {"table": table, "column": column}).scalar()
+
+
+def migrate_product_json_columns(engine: Engine) -> None:
+    """Переводит JSON колонки товаров из Text в JSONB и создает GIN индексы"""
+    with engine.begin() as conn:
+        for column in PRODUCT_JSON_COLUMNS:
+            if _column_type(conn, "products", column) != "text":
+                continue
+            # Строка с некорректным JSON сохраняется как JSON строка, а не ломает ALTER
+            conn.execute(text(
+                "CREATE OR REPLACE FUNCTION pg_temp.text_to_jsonb(value text) RETURNS jsonb "
+                "LANGUAGE plpgsql IMMUTABLE AS $$ "
+                "BEGIN RETURN value::jsonb; "
+                "EXCEPTION WHEN others THEN RETURN to_jsonb(value); END $$"
+            ))
+            conn.execute(text(
+                f"ALTER TABLE products ALTER COLUMN {column} TYPE JSONB "
+                f"USING CASE WHEN {column} IS NULL OR btrim({column}) = '' "
+                f"THEN NULL ELSE pg_temp.text_to_jsonb({column}) END"
+            ))
+            logger.info(f"Колонка products.{column} переведена в JSONB")
+        for index_name, column in PRODUCT_GIN_INDEXES.items():
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON products USING gin ({column} jsonb_path_ops)"
+            ))
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """Выполняет все шаги миграции схемы"""
+    try:
+        migrate_product_json_columns(engine)
+        migrate_activity_to_partitioned(engine)
+        ensure_activity_partitions(engine, ACTIVITY_PARTITIONS_AHEAD)
+    except Exception as e:
+        # Без миграции модели не совпадают со схемой - запуск бота прерывается
+        logger.exception(f"Ошибка миграции схемы БД: {e}")
+        raise
@@ -5,7 +5,8 @@
 
 """
 from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, DateTime, func, BigInteger, \
-    Boolean, Date
+    Boolean, Date, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -44,12 +45,12 @@ class Product(AbstractBase):
     article = Column(String(100))
     description = Column(Text)
     full_description = Column(Text)
-    characteristics = Column(Text)  # Будем хранить как JSON строку
+    characteristics = Column(JSONB)  # {"Страна производства": "Норвегия", ...}
     main_image = Column(String(500))
-    additional_images = Column(Text)  # Будем хранить как JSON строку
+    additional_images = Column(JSONB)  # ["url1", "url2", ...]
     weight = Column(String(100))
     calories = Column(String(100))
-    nutrition_facts = Column(Text)  # Будем хранить как JSON строку
+    nutrition_facts = Column(JSONB)  # {"Белки": "20 г", ...}
     ostatok = Column(Float)
     # Внешний ключ для связи с категорией
     category_id = Column(Integer, ForeignKey('categories.id'))
@@ -62,7 +63,15 @@ class Product(AbstractBase):
 
     # Связь с элементами заказа
     order_items = relationship("OrderItems", back_populates="product")
-    
+
+    # GIN индексы для фильтрации по атрибутам (оператор @>)
+    __table_args__ = (
+        Index("ix_products_characteristics", characteristics,
+              postgresql_using="gin", postgresql_ops={"characteristics": "jsonb_path_ops"}),
+        Index("ix_products_nutrition_facts", nutrition_facts,
+              postgresql_using="gin", postgresql_ops={"nutrition_facts": "jsonb_path_ops"}),
+    )
+
     def __repr__(self):
         return f"<Product(id={self.id}, name='{self.name}', price={self.price})>"
 
@@ -89,17 +98,80 @@ class Costumer(AbstractBase):
 
 class CostumerActivity(AbstractBase):
     __tablename__ = "costumer_activity"
+    # Помесячные партиции по created_at (см. database.partitions), ключ партиции входит в PK
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     chat_id = Column(BigInteger)
     event_type = Column(String(32))
     action = Column(String(255))
     payload = Column(String(255), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, primary_key=True)
     activity_date = Column(Date, index=True)
     week = Column(Integer, index=True)
     month = Column(Integer, index=True)
     year = Column(Integer, index=True)
 
 
+class ActivityDailyRollup(Base):
+    """Число событий за день по типу события и префиксу действия (см. services.activity_rollups)"""
+    __tablename__ = "activity_daily_rollup"
+    day = Column(Date, primary_key=True)
+    event_type = Column(String(32), primary_key=True)
+    action = Column(String(64), primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+
+
+class ActivityDailyChat(Base):
+    """Уникальные чаты за день с числом их событий"""
+    __tablename__ = "activity_daily_chats"
+    day = Column(Date, primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+
+
+class SearchQueryStat(Base):
+    """Частые поисковые запросы за день: kind='query' - все, kind='miss' - без результатов"""
+    __tablename__ = "search_query_stats"
+    day = Column(Date, primary_key=True)
+    kind = Column(String(16), primary_key=True)
+    query = Column(String(100), primary_key=True)
+    hits = Column(Integer, nullable=False, default=0)
+
+
+class FsmRecord(Base):
+    """Состояние и данные FSM aiogram (см. services.fsm_storage)"""
+    __tablename__ = "fsm_storage"
+    key = Column(String(255), primary_key=True)
+    state = Column(String(255), nullable=True)
+    data = Column(JSONB, nullable=False, default=dict)
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+
+class ActivityHll(Base):
+    """HyperLogLog скетч уникальных чатов за день (см. services.unique_users)"""
+    __tablename__ = "activity_hll"
+    day = Column(Date, primary_key=True)
+    sketch = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class ImageCheck(Base):
+    """Результат проверки доступности картинки товара по ссылке (см. services.image_checks)"""
+    __tablename__ = "image_checks"
+    url = Column(Text, primary_key=True)
+    ok = Column(Boolean, nullable=False)
+    status = Column(Integer, nullable=True)
+    checked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class ProductImage(Base):
+    """file_id картинки товара в Telegram; действителен, пока main_image товара равен source_url"""
+    __tablename__ = "product_images"
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    source_url = Column(String(500), nullable=False)
+    file_id = Column(String(255), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
 # Define CartItems before Cart to avoid forward reference issues
 class CartItems(AbstractBase):
     __tablename__ = 'cart_items'
@@ -0,0 +1,141 @@
+"""
+Модуль database.partitions
+
+Помесячное декларативное партиционирование таблицы costumer_activity
+(RANGE по created_at).
+
+- migrate_activity_to_partitioned: однократный перенос старой обычной таблицы
+  в партиционированную;
+- ensure_activity_partitions: создание партиций на текущий и будущие месяцы;
+- apply_activity_retention: удаление (DROP) или архивирование (DETACH) партиций
+  старше срока хранения - O(1) на партицию вместо DELETE по всей таблице.
+"""
+import re
+from datetime import date, datetime, timezone
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from database.models import CostumerActivity
+
+TABLE = "costumer_activity"
+LEGACY_TABLE = "costumer_activity_legacy"
+PARTITION_RE = re.compile(rf"^{TABLE}_(\d{{4}})_(\d{{2}})$")
+
+
+def add_months(day: date, months: int) -> date:
+    """Первое число месяца, отстоящего от day на months месяцев"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    return f"{TABLE}_{month_start.year:04d}_{month_start.month:02d}"
+
+
+def _relkind(conn, name: str):
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+                        {"name": name}).scalar()
+
+
+def list_activity_partitions(conn) -> dict[date, str]:
+    """Партиции costumer_activity: {первое число месяца: имя таблицы}"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": TABLE}).scalars()
+    partitions = {}
+    for name in rows:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def _create_partition(conn, month_start: date) -> None:
+    month_end = add_months(month_start, 1)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month_start)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{month_start.isoformat()} 00:00:00+00') TO ('{month_end.isoformat()} 00:00:00+00')"
+    ))
+
+
+def ensure_activity_partitions(engine: Engine, months_ahead: int = 2) -> None:
+    """Создает партиции с текущего месяца на months_ahead месяцев вперед"""
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    with engine.begin() as conn:
+        if _relkind(conn, TABLE) != "p":
+            return
+        existing = list_activity_partitions(conn)
+        for offset in range(months_ahead + 1):
+            month_start = add_months(this_month, offset)
+            if month_start not in existing:
+                _create_partition(conn, month_start)
+                logger.info(f"Создана партиция {partition_name(month_start)}")
+
+
+def apply_activity_retention(engine: Engine, retention_months: int, mode: str = "drop") -> None:
+    """Удаляет или отсоединяет партиции старше retention_months месяцев.
+
+    mode="drop" - DROP TABLE партиции;
+    mode="detach" - DETACH PARTITION и переименование в costumer_activity_archive_YYYY_MM.
+    """
+    if retention_months <= 0:
+        return
+    oldest_kept = add_months(datetime.now(timezone.utc).date().replace(day=1), -retention_months)
+    with engine.begin() as conn:
+        for month_start, name in sorted(list_activity_partitions(conn).items()):
+            if month_start >= oldest_kept:
+                continue
+            if mode == "detach":
+                archive = name.replace(TABLE, f"{TABLE}_archive", 1)
+                conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+                conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive}"))
+                logger.info(f"Партиция {name} отсоединена в архив {archive}")
+            else:
+                conn.execute(text(f"DROP TABLE {name}"))
+                logger.info(f"Партиция {name} удалена по сроку хранения")
+
+
+def migrate_activity_to_partitioned(engine: Engine) -> None:
+    """Переносит обычную таблицу costumer_activity в партиционированную.
+
+    Старая таблица переименовывается, создается партиционированная таблица с
+    партициями на весь диапазон данных, строки копируются, последовательность id
+    продолжается с максимального значения, старая таблица удаляется.
+    """
+    with engine.begin() as conn:
+        if _relkind(conn, TABLE) != "r":
+            return
+        logger.info("Перевод costumer_activity на помесячные партиции...")
+        old_sequence = conn.execute(text(f"SELECT pg_get_serial_sequence('{TABLE}', 'id')")).scalar()
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}"))
+        # Индексы, PK и последовательность старой таблицы занимают имена новой
+        for (index_name,) in conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table AND indexname NOT LIKE '%pkey'"),
+                {"table": LEGACY_TABLE}).all():
+            conn.execute(text(f"DROP INDEX {index_name}"))
+        conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {LEGACY_TABLE}_pkey"))
+        if old_sequence:
+            conn.execute(text(f"ALTER SEQUENCE {old_sequence} RENAME TO {LEGACY_TABLE}_id_seq"))
+
+        CostumerActivity.__table__.create(conn)
+        first, last = conn.execute(text(f"SELECT min(created_at), max(created_at) FROM {LEGACY_TABLE}")).one()
+        if first is not None:
+            month_start = first.astimezone(timezone.utc).date().replace(day=1)
+            last_month = last.astimezone(timezone.utc).date().replace(day=1)
+            while month_start <= last_month:
+                _create_partition(conn, month_start)
+                month_start = add_months(month_start, 1)
+
+        columns = ", ".join(c.name for c in CostumerActivity.__table__.columns)
+        copied = conn.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {LEGACY_TABLE}")).rowcount
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f"(SELECT COALESCE(max(id), 0) + 1 FROM {TABLE}), false)"
+        ))
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+        logger.info(f"costumer_activity переведена на партиции, перенесено {copied} строк")
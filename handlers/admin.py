@@ -23,7 +23,6 @@
     Для добавления нового обработчика используйте декоратор @router с указанием типа обновления,
     например: @router.message(Command("команда")) или @router.callback_query(F.data == "действие")
 """
-import asyncio
 
 from aiogram import Router, F, Bot
 from aiogram.enums import ParseMode
@@ -65,12 +64,15 @@ from keyboards.admin_kb import (
     get_close_entity,
     get_issued_entity,
 )
+from services.background_jobs import schedule_image_prewarm
+from services.catalog_snapshot import schedule_catalog_refresh
 from services.filters import IsAdmin
 from services.search import plural_form
+from services.user_store import UserStore
 
 router = Router(name='admin')
 
-user_cart_messages = {}
+user_cart_messages = UserStore("admin_cart_messages")
 
 
 from sqlalchemy.exc import SQLAlchemyError
@@ -337,7 +339,8 @@ async def send_news(data: dict, users: list, bot: Bot):
             # Снять отметку о рассылке
             logger.exception(f"{user}, заблокировал бота")
         except TelegramRetryAfter as e:
-            await asyncio.sleep(0.1)
+            # Ограничитель запросов бота уже повторял отправку
+            logger.warning(f"Рассылка пользователю {user} не доставлена, Telegram просит подождать {e.retry_after} с")
         except Exception as e:
             # Ловим другие ошибки и продолжаем
             logger.exception(f"Ошибка при отправке пользователю {user}: {e}")
@@ -572,6 +575,9 @@ async def load_dates(message: Message, bot: Bot):
     try:
         count = load_data("data/forload.xlsx", engine=engine)
         logger.info(f"Загружено успешно {count} строк 'load_data' в 'load_dates' ")
+        if count:
+            schedule_catalog_refresh()
+            schedule_image_prewarm()
     except Exception as e:
         logger.exception(f"Ошибка загрузка данных из бота в 'load_data' в 'load_dates': {e}")
         return
@@ -621,7 +627,7 @@ async def show_cart_for_done(callback: CallbackQuery):
         )
         return
     user_id = callback.from_user.id
-    user_cart_messages[user_id] = []
+    message_ids = []
     # Вывод всех товаров как отдельные сообщения
     for item in items:
         text = (
@@ -630,7 +636,8 @@ async def show_cart_for_done(callback: CallbackQuery):
             f"Стоимость: <b>{item.total_price:.2f} ₽</b>"
         )
         sent_message = await callback.message.answer(text=text, parse_mode=ParseMode.HTML)
-        user_cart_messages[user_id].append(sent_message.message_id)
+        message_ids.append(sent_message.message_id)
+    await user_cart_messages.set(user_id, message_ids)
     
     # Отправка кнопок управления заказом в зависимости от подготовки или выдачи заказа
     try:
@@ -649,14 +656,14 @@ async def show_cart_for_done(callback: CallbackQuery):
             reply_markup=get_admin_confirmentity_kb(cart_id, "Cart"),
             parse_mode="Markdown"
         )
-        user_cart_messages[user_id].append(buttons_message.message_id)
+        await user_cart_messages.append(user_id, buttons_message.message_id)
     else:
         buttons_message = await callback.message.answer(
             "Выберите действие:",
             reply_markup=get_issued_entity(cart_id, "Cart"),
             parse_mode="Markdown",
         )
-        user_cart_messages[user_id].append(buttons_message.message_id)
+        await user_cart_messages.append(user_id, buttons_message.message_id)
 
 
 @router.callback_query(F.data.startswith("Back"))
@@ -669,10 +676,8 @@ async def go_back(callback: CallbackQuery) -> None:
         None
     """
     user_id = callback.from_user.id
-    if user_id in user_cart_messages:
-        for mid in user_cart_messages[user_id]:
-            await callback.bot.delete_message(user_id, mid)
-        del user_cart_messages[user_id]
+    for mid in await user_cart_messages.pop(user_id, []):
+        await callback.bot.delete_message(user_id, mid)
     logger.info(f"Пользователь нажал 'назад' 'go_back' от {callback.from_user.id}")
     await callback.answer("Экран очищен")
 
@@ -699,7 +704,7 @@ async def get_cart_for_done(callback: CallbackQuery) -> None:
         reply_markup=get_close_entity(cart_id, "Cart"),
         parse_mode=ParseMode.HTML
     )
-    user_cart_messages[user_id].append(sent_message.message_id)
+    await user_cart_messages.append(user_id, sent_message.message_id)
     await callback.answer()
 
 
@@ -747,7 +752,7 @@ async def mess_cart_for_done(callback: CallbackQuery, state: FSMContext, bot: Bo
             return
         else:
             await state.update_data(text=text)
-            await state.update_data(user=user)
+            await state.update_data(user_id=user.id)
             await state.update_data(cart_id=cart_id)
             await callback.message.answer("Введите текст комментария")
             await state.set_state(CommentStates.Comment)
@@ -775,18 +780,18 @@ async def handle_comment(message: Message, state: FSMContext, bot: Bot) -> None:
     """
     await state.update_data(comment=message.text)
     my_data: dict = await state.get_data()
-    user = my_data.get('user')
+    user_id = my_data.get('user_id')
     cart_id: int = my_data.get('cart_id')
     text = f"{my_data.get('text')} \n {my_data.get('comment')}"
     try:
-        await bot.send_message(chat_id=user.id, text=text)
+        await bot.send_message(chat_id=user_id, text=text)
         await message.answer(("Клиент уведомлен о готовности заказа. \n"
                               "Заказ перешел в категорию 'Для выдачи'"))
         logger.info(
-            f"Пользователю {user.id} направлен комментарий к заказу {cart_id:} в 'handle_comment'")
+            f"Пользователю {user_id} направлен комментарий к заказу {cart_id:} в 'handle_comment'")
     except Exception as e:
         logger.exception(
-            f"Ошибка при отправке комментария к заказу пользователю {user.id} "
+            f"Ошибка при отправке комментария к заказу пользователю {user_id} "
             f"'handle_comment' от {message.from_user.id}: {e}"
         )
         return
@@ -885,7 +890,7 @@ async def show_order_for_done(callback: CallbackQuery):
         )
         return
     user_id = callback.from_user.id
-    user_cart_messages[user_id] = []
+    message_ids = []
     try:
         items = get_entity_items(session, order_id, OrderItems)
         logger.info(
@@ -905,7 +910,8 @@ async def show_order_for_done(callback: CallbackQuery):
             f"Стоимость: <b>{item.total_price:.2f} ₽</b>"
         )
         sent_message = await callback.message.answer(text=text, parse_mode=ParseMode.HTML)
-        user_cart_messages[user_id].append(sent_message.message_id)
+        message_ids.append(sent_message.message_id)
+    await user_cart_messages.set(user_id, message_ids)
 
     # Отправка кнопок управления заказом в зависимости от подготовки или выдачи заказа
     try:
@@ -925,14 +931,14 @@ async def show_order_for_done(callback: CallbackQuery):
             reply_markup=get_admin_confirmentity_kb(order_id, "Order"),
             parse_mode="Markdown"
         )
-        user_cart_messages[user_id].append(buttons_message.message_id)
+        await user_cart_messages.append(user_id, buttons_message.message_id)
     else:
         buttons_message = await callback.message.answer(
             "Выберите действие:",
             reply_markup=get_issued_entity(order_id, "Order"),
             parse_mode="Markdown",
         )
-        user_cart_messages[user_id].append(buttons_message.message_id)
+        await user_cart_messages.append(user_id, buttons_message.message_id)
 
 
 @router.callback_query(F.data.startswith("OrderDone_"))
@@ -957,7 +963,7 @@ async def get_order_for_done(callback: CallbackQuery) -> None:
         reply_markup=get_close_entity(order_id, "Order"),
         parse_mode=ParseMode.HTML
     )
-    user_cart_messages[user_id].append(sent_message.message_id)
+    await user_cart_messages.append(user_id, sent_message.message_id)
     await callback.answer()
 
 
@@ -1022,7 +1028,7 @@ async def mess_order_for_done(callback: CallbackQuery, state: FSMContext, bot: B
         return
     else:
         await state.update_data(text=text)
-        await state.update_data(user=user)
+        await state.update_data(user_id=user.id)
         await state.update_data(cart_id=order_id)
         await callback.message.answer("Введите текст комментария")
         logger.info(
@@ -1045,11 +1051,11 @@ async def handle_comment_order(message: Message, state: FSMContext, bot: Bot) ->
     """
     await state.update_data(comment=message.text)
     my_data: dict = await state.get_data()
-    user = my_data.get('user')
+    user_id = my_data.get('user_id')
     order_id: int = my_data.get('cart_id')
     text = f"{my_data.get('text')} \n {my_data.get('comment')}"
     try:
-        await bot.send_message(chat_id=user.id, text=text)
+        await bot.send_message(chat_id=user_id, text=text)
         await message.answer("Клиент уведомлен о заказе \n"
                              "заказ перешел в ожидание доставки")
         set_entity_for_issue(session, order_id, Order)
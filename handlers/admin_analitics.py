@@ -1,3 +1,4 @@
+import html
 import os
 from datetime import datetime
 
@@ -7,12 +8,19 @@ from loguru import logger
 from sqlalchemy.orm import Session
 
 from database.db import export_data_to_excel
+from database.instrumentation import (
+    db_query_seconds,
+    db_pool_checkout_seconds,
+    db_queries_per_update,
+    db_slow_queries,
+)
 from keyboards.admin_kb import get_upload_kb
+from services.activity_rollups import get_daily_activity, get_top_actions
+from services.search_stats import top_search_queries
+from services.unique_users import unique_users_report
 
 router = Router(name='admin_analitics')
 
-user_cart_messages = {}
-
 
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -38,7 +46,7 @@ async def export_table(callback: CallbackQuery, session: Session):
     :param callback: CallbackQuery
     :param session: Session
     """
-    table_name = callback.data.split("_")[1]
+    table_name = callback.data.removeprefix("export_")
     if table_name == "back":
         await callback.message.delete()
         return
@@ -74,3 +82,74 @@ async def get_log(callback: CallbackQuery):
             return
 
 
+@router.callback_query(F.data == "db_stats")
+async def show_db_stats(callback: CallbackQuery):
+    """Send aggregated DB metrics to admin: per-handler query count, query time and pool waits
+    :param callback: CallbackQuery
+    """
+    lines = ["<b>📈 Метрики БД с момента запуска</b>"]
+    pool = db_pool_checkout_seconds.stats()
+    lines.append(f"\nОжидание пула: {pool['count']} выдач, p95 {pool['p95'] * 1000:.1f} мс, "
+                 f"p99 {pool['p99'] * 1000:.1f} мс")
+    handlers = sorted(db_queries_per_update.labels_seen(),
+                      key=lambda labels: db_query_seconds.stats(*labels)["sum"], reverse=True)
+    for labels in handlers[:15]:
+        per_update = db_queries_per_update.stats(*labels)
+        queries = db_query_seconds.stats(*labels)
+        lines.append(
+            f"\n<b>{labels[0]}</b>: {per_update['count']} апд., "
+            f"{per_update['avg']:.1f} запр./апд., "
+            f"запрос avg {queries['avg'] * 1000:.1f} мс / p95 {queries['p95'] * 1000:.1f} мс, "
+            f"медленных {int(db_slow_queries.value(*labels))}"
+        )
+    await callback.message.answer("\n".join(lines), parse_mode="HTML")
+    await callback.answer()
+
+
+@router.callback_query(F.data == "activity_stats")
+async def show_activity_stats(callback: CallbackQuery, session: Session):
+    """Send activity report from daily rollups: events and unique chats per day, top actions
+    :param callback: CallbackQuery
+    :param session: Session
+    """
+    lines = ["<b>📊 Активность за 7 дней</b>", ""]
+    for day, events, chats in get_daily_activity(session, days=7):
+        lines.append(f"{day.strftime('%d.%m')}: {events} событий, {chats} пользователей")
+    lines.append("\n<b>Популярные действия за 30 дней</b>")
+    for event_type, action, events in get_top_actions(session, days=30):
+        kind = "кнопка" if event_type == "callback_query" else "сообщение"
+        lines.append(f"{action} ({kind}): {events}")
+    await callback.message.answer("\n".join(lines), parse_mode="HTML")
+    await callback.answer()
+
+
+@router.callback_query(F.data == "unique_users")
+async def show_unique_users(callback: CallbackQuery, session: Session):
+    """Send approximate unique users (HyperLogLog): DAU for 7 days, WAU and MAU
+    :param callback: CallbackQuery
+    :param session: Session
+    """
+    report = unique_users_report(session)
+    lines = ["<b>👥 Уникальные пользователи (≈, UTC)</b>", ""]
+    for day, count in report["daily"]:
+        lines.append(f"{day.strftime('%d.%m')}: {count}")
+    lines.append(f"\nWAU (7 дней): {report['wau']}")
+    lines.append(f"MAU (30 дней): {report['mau']}")
+    await callback.message.answer("\n".join(lines), parse_mode="HTML")
+    await callback.answer()
+
+
+@router.callback_query(F.data == "search_stats")
+async def show_search_stats(callback: CallbackQuery, session: Session):
+    """Send top search queries and top queries without results for 30 days
+    :param callback: CallbackQuery
+    :param session: Session
+    """
+    lines = ["<b>🔎 Частые запросы за 30 дней</b>"]
+    for query, hits in top_search_queries(session, "query"):
+        lines.append(f"{html.escape(query)}: {hits}")
+    lines.append("\n<b>Не найдено</b>")
+    for query, hits in top_search_queries(session, "miss"):
+        lines.append(f"{html.escape(query)}: {hits}")
+    await callback.message.answer("\n".join(lines), parse_mode="HTML")
+    await callback.answer()
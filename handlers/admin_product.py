@@ -9,10 +9,12 @@ from loguru import logger
 from database.db import session, get_product_by_article, entity_to_excel, delete_product_by_id, update_prooduct_field
 from database.models import Product
 from keyboards.admin_kb import get_product_change_kb, get_product_delete_kb, get_edit_product_kb
+from services.catalog_snapshot import schedule_catalog_refresh
+from services.user_store import UserStore
 
 router = Router(name='admin_product')
 
-user_messages = {}
+user_messages = UserStore("admin_product_messages")
 
 
 from sqlalchemy.exc import SQLAlchemyError
@@ -43,9 +45,8 @@ async def get_product_article(callback: CallbackQuery, state: FSMContext):
         callback
         state
     """
-    user_messages[callback.from_user.id] = []
     msg = await callback.message.answer("Введите артикул товара:")
-    user_messages[callback.from_user.id].append(msg.message_id)
+    await user_messages.set(callback.from_user.id, [msg.message_id])
     await state.set_state(ViewProduct.article)
 
 
@@ -53,10 +54,10 @@ async def get_product_article(callback: CallbackQuery, state: FSMContext):
 async def view_product(message: Message, state: FSMContext):
     """Обработчик ввода артикула товара, поиск товара в БД и отправка юзеру"""
     article = message.text
-    user_messages[message.from_user.id].append(message.message_id)
+    await user_messages.append(message.from_user.id, message.message_id)
     try:
         tovar = get_product_by_article(session, article)
-        await state.update_data(tovar=tovar)
+        await state.update_data(product_id=tovar.id if tovar else None)
         logger.info(f"'view_product' Товар {article} загружен для {message.from_user.id}")
     except Exception as e:
         logger.error(f"'view_product'  Ошибка при загрузке товара {article} для {message.from_user.id}: {e}")
@@ -71,7 +72,7 @@ async def view_product(message: Message, state: FSMContext):
     try:
         file_name = entity_to_excel(tovar)
         msg = await message.answer_document(FSInputFile(file_name))
-        user_messages[message.from_user.id].append(msg.message_id)
+        await user_messages.append(message.from_user.id, msg.message_id)
         text = (f"Артикль: <b>{tovar.article}</b>\n"
                 f"Название: <b>{tovar.name}</b>\n"
                 f"Цена: <b>{tovar.price}</b>\n"
@@ -80,7 +81,7 @@ async def view_product(message: Message, state: FSMContext):
                 f"Описание: <b>{tovar.description}</b>\n"
                 f"Фото: <b>{tovar.main_image}</b>\n")
         msg = await message.answer(text=text, reply_markup=get_product_change_kb(tovar.id, tovar.article))
-        user_messages[message.from_user.id].append(msg.message_id)
+        await user_messages.append(message.from_user.id, msg.message_id)
         print(tovar.id)
         logger.info(f"Товар {article} загружен в файл для {message.from_user.id}")
         os.remove(file_name)
@@ -109,7 +110,7 @@ async def delete_product(callback: CallbackQuery):
         return
     msg = await callback.message.answer(f"Подтвердите удаление товара '{product.name}', артикул №{product.article}",
                                         reply_markup=get_product_delete_kb(product_id))
-    user_messages[callback.from_user.id].append(msg.message_id)
+    await user_messages.append(callback.from_user.id, msg.message_id)
 
 
 @router.callback_query(F.data.startswith("deleteconfirm_"))
@@ -124,16 +125,15 @@ async def confirm_delete_product(callback: CallbackQuery):
         return
     if delete_product_by_id(session, product_id):
         commit_session(session)
+        schedule_catalog_refresh()
         await callback.message.answer(f"✅ Товар удален")
         logger.info(f"Успешное удаление товара {product_id} в confirm_delete_product")
         user_id = callback.from_user.id
-        if user_id in user_messages:
-            for mid in user_messages[user_id]:
-                try:
-                    await callback.bot.delete_message(user_id, mid)
-                except Exception as e:
-                    logger.exception(f"Ошибка при удалении сообщений в confirm_delete_product: {e}")
-            del user_messages[user_id]
+        for mid in await user_messages.pop(user_id, []):
+            try:
+                await callback.bot.delete_message(user_id, mid)
+            except Exception as e:
+                logger.exception(f"Ошибка при удалении сообщений в confirm_delete_product: {e}")
     else:
         commit_session(session)
         await callback.answer("❌ Товар не найден", show_alert=True)
@@ -145,13 +145,11 @@ async def confirm_back_product(callback: CallbackQuery):
     await callback.message.delete()
     await callback.answer("❌ Отмена удаления товара")
     user_id = callback.from_user.id
-    if user_id in user_messages:
-        for mid in user_messages[user_id]:
-            try:
-                await callback.bot.delete_message(user_id, mid)
-            except Exception as e:
-                logger.exception(f"Ошибка при удалении сообщений confirm_back_product: {e}")
-        del user_messages[user_id]
+    for mid in await user_messages.pop(user_id, []):
+        try:
+            await callback.bot.delete_message(user_id, mid)
+        except Exception as e:
+            logger.exception(f"Ошибка при удалении сообщений confirm_back_product: {e}")
     logger.info(f"Отмена удаления товара в confirm_delete_product")
 
 
@@ -186,6 +184,7 @@ async def update_image(message: Message, state: FSMContext):
     try:
         update_prooduct_field(session, product_id, field, value)
         commit_session(session)
+        schedule_catalog_refresh()
         await message.answer("🖼 Изображение обновлено")
     except Exception as e:
         await message.answer(f"Error {e}")
@@ -204,6 +203,7 @@ async def enter_new_value(message: Message, state: FSMContext):
     try:
         update_prooduct_field(session, product_id, field, value)
         commit_session(session)
+        schedule_catalog_refresh()
         await message.answer("✅ Товар обновлен")
     except Exception as e:
         await message.answer(f"Error {e}")
@@ -9,6 +9,7 @@ from loguru import logger
 
 from database.db import session, get_all_admin, export_data_to_excel, set_admin
 from keyboards.admin_kb import get_set_admins
+from services.filters import evict_admin
 
 router = Router(name='admin_setadmin')
 
@@ -77,9 +78,11 @@ async def set_admin_id(message: Message, state: FSMContext):
     if my_action == 'delete':
         set_admin(session, admin_id, to_delete=True)
         commit_session(session)
+        evict_admin(admin_id)
         await message.answer("Админ удален")
     elif my_action == 'add':
         set_admin(session, admin_id, to_delete=False)
         commit_session(session)
+        evict_admin(admin_id)
         await message.answer("Админ добавлен")
     await state.clear()
@@ -1,3 +1,4 @@
+from functools import partial
 from typing import Sequence, Any
 
 from aiogram import Router, F, types
@@ -17,7 +18,6 @@ from database.db import (
     get_entity_items,
     delete_entity_item,
     confirm_entity,
-    change_item_quantity,
     get_all_admin,
     delete_entity,
     get_entity_item,
@@ -36,11 +36,14 @@ from keyboards.carts_kb import (
     back_kb,
 )
 from keyboards.categorieskb import get_categories_kb, show_in_stock_kb
+from services.catalog_snapshot import catalog_product
+from services.quantity_coalescer import quantity_coalescer
+from services.user_store import UserStore
 
 router = Router(name="carts")
 
 # Храним список сообщений, чтобы потом удалить
-user_cart_messages = {}
+user_cart_messages = UserStore("cart_messages")
 
 
 from sqlalchemy.exc import SQLAlchemyError
@@ -179,8 +182,8 @@ async def show_carts(message: Message):
             f"  в 'show_carts' выполнен неуспешно: {e}"
         )
         return
-        # Сохранение списка сообщений пользователя
-    user_cart_messages[message.from_user.id] = []
+    # Сохранение списка сообщений пользователя
+    message_ids = []
 
     # Вывод всех товаров как отдельные сообщения
     for item in items:
@@ -194,7 +197,7 @@ async def show_carts(message: Message):
             reply_markup=item_action_kb(item.id, "CartItem"),
             parse_mode=ParseMode.HTML
         )
-        user_cart_messages[message.from_user.id].append(msg.message_id)
+        message_ids.append(msg.message_id)
 
     # Итоговая кнопка
     final_msg = await message.answer(
@@ -202,80 +205,54 @@ async def show_carts(message: Message):
         reply_markup=cart_main_kb(cart.id, "Cart"),
         parse_mode="Markdown"
     )
-    user_cart_messages[message.from_user.id].append(final_msg.message_id)
+    message_ids.append(final_msg.message_id)
+    await user_cart_messages.set(message.from_user.id, message_ids)
 
 
 # -------------------------------------------------------
 #               Кнопки + и -
 # -------------------------------------------------------
 
-@router.callback_query(F.data.startswith("CartItem_plus"))
-async def plus_item(call: CallbackQuery):
-    """Обработка нажатия кнопки увеличения товара в корзине"""
-    _, item_id = call.data.split(":")
-    try:
-        item_id = int(item_id)
-    except Exception as e:
-        logger.exception(
-            f" Запрос пользователя {call.from_user.id} преобразование номера товара {item_id} в целое "
-            f"  в 'plus_item' выполнен неуспешно: {e}"
-        )
+async def show_cart_item(message: Message, item_id: int, row) -> None:
+    """Обновляет карточку позиции корзины после записи количества"""
+    if row is None:
         return
-    try:
-        item = change_item_quantity(session, item_id, +1, CartItems)
-        # commit_session(session)
-        logger.info(
-            f"'carts.plus_item':  {call.from_user.id} получил данные 'change_item_quantity' "
-        )
-    except Exception as e:
-        logger.exception(
-            f" Запрос пользователя {call.from_user.id} в БД 'change_item_quantity', номер товара {item_id}' "
-            f"  в 'plus_item' выполнен неуспешно: {e}"
-        )
-        return
-
-    await call.message.edit_text(
-        f"🛒 <b>{item.product.name}</b>\n"
-        f"Количество: <b>{item.quantity}</b> {item.product.unit}\n"
-        f"Стоимость: <b>{item.total_price:.2f} ₽</b>",
-        reply_markup=item_action_kb(item.id, "CartItem"),
+    product_id, quantity, unit_price = row
+    product = catalog_product(session, product_id)
+    await message.edit_text(
+        f"🛒 <b>{product.name}</b>\n"
+        f"Количество: <b>{quantity}</b> {product.unit}\n"
+        f"Стоимость: <b>{unit_price * quantity:.2f} ₽</b>",
+        reply_markup=item_action_kb(item_id, "CartItem"),
         parse_mode=ParseMode.HTML
     )
-    await call.answer()
 
 
-@router.callback_query(F.data.startswith("CartItem_minus"))
-async def minus_item(call: CallbackQuery):
-    """Обработка нажатия кнопки уменьшения товара в корзине"""
+async def change_cart_item(call: CallbackQuery, delta: int, handler_name: str):
+    """Отвечает на нажатие сразу, изменение количества копится в quantity_coalescer"""
     _, item_id = call.data.split(":")
     try:
         item_id = int(item_id)
     except Exception as e:
         logger.exception(
             f" Запрос пользователя {call.from_user.id} преобразование номера товара {item_id} в целое "
-            f"  в 'minus_item' выполнен неуспешно: {e}"
+            f"  в '{handler_name}' выполнен неуспешно: {e}"
         )
         return
-    try:
-        item = change_item_quantity(session, item_id, -1, CartItems)
-        # commit_session(session)
-        logger.info(
-            f"'carts.minus_item':  {call.from_user.id} получил данные 'change_item_quantity' "
-        )
-    except Exception as e:
-        logger.exception(
-            f" Запрос пользователя {call.from_user.id} в БД 'change_item_quantity', номер товара {item_id}' "
-            f"  в 'minus_item' выполнен неуспешно: {e}"
-        )
-        return
-    await call.message.edit_text(
-        f"🛒 <b>{item.product.name}</b>\n"
-        f"Количество: <b>{item.quantity}</b> {item.product.unit}\n"
-        f"Стоимость: <b>{item.total_price:.2f} ₽</b>",
-        reply_markup=item_action_kb(item.id, "CartItem"),
-        parse_mode=ParseMode.HTML
-    )
     await call.answer()
+    quantity_coalescer.add(CartItems, item_id, delta, partial(show_cart_item, call.message, item_id))
+
+
+@router.callback_query(F.data.startswith("CartItem_plus"))
+async def plus_item(call: CallbackQuery):
+    """Обработка нажатия кнопки увеличения товара в корзине"""
+    await change_cart_item(call, +1, "plus_item")
+
+
+@router.callback_query(F.data.startswith("CartItem_minus"))
+async def minus_item(call: CallbackQuery):
+    """Обработка нажатия кнопки уменьшения товара в корзине"""
+    await change_cart_item(call, -1, "minus_item")
 
 
 # -------------------------------------------------------
@@ -387,13 +364,11 @@ async def confirm_cart_handler(call: CallbackQuery):
     )
     # Удаляем все сообщения корзины
     user_id = call.from_user.id
-    if user_id in user_cart_messages:
-        for mid in user_cart_messages[user_id]:
-            try:
-                await call.bot.delete_message(user_id, mid)
-            except:
-                pass
-        del user_cart_messages[user_id]
+    for mid in await user_cart_messages.pop(user_id, []):
+        try:
+            await call.bot.delete_message(user_id, mid)
+        except:
+            pass
     # Уведомление админам
     try:
         admins = get_all_admin(session)
@@ -495,14 +470,11 @@ async def delete_cancel(call: CallbackQuery):
 @router.callback_query(F.data == "Cart_cleanup")
 async def cleanup_messages(call: CallbackQuery):
     user_id = call.from_user.id
-    if user_id in user_cart_messages:
-        for mid in user_cart_messages[user_id]:
-            try:
-                await call.bot.delete_message(user_id, mid)
-            except:
-                pass
-        del user_cart_messages[user_id]
-    user_cart_messages.clear()
+    for mid in await user_cart_messages.pop(user_id, []):
+        try:
+            await call.bot.delete_message(user_id, mid)
+        except:
+            pass
     await call.answer("Экран очищен")
 
 
@@ -512,7 +484,7 @@ async def cleanup_messages(call: CallbackQuery):
 @router.callback_query(F.data == "previous_cart")
 async def show_previus_cart(callback: CallbackQuery):
     """Вывод предыдущих корзин пользователя"""
-    user_cart_messages[callback.from_user.id] = []
+    await user_cart_messages.set(callback.from_user.id, [])
     try:
         user_id = get_costumer_id(session, callback.from_user.id)
         previous_carts: Sequence[Any] = get_entity_by_user_id(session, user_id, Cart)
@@ -547,7 +519,7 @@ async def show_previus_cart(callback: CallbackQuery):
             "Список Ваших заказов:",
             reply_markup=previous_cartlist_kb(previous_carts),
         )
-        user_cart_messages[callback.from_user.id].append(callback.message.message_id)
+        await user_cart_messages.append(callback.from_user.id, callback.message.message_id)
         await callback.answer()
 
 
@@ -576,21 +548,20 @@ async def show_previus_item(callback: CallbackQuery):
         return
     start_msg = await callback.message.answer(text = f"🛒 <b>Заказ №{cart_id}</b>")
     user_id = callback.from_user.id
-    if user_id not in user_cart_messages:
-        user_cart_messages[user_id] = []
-    user_cart_messages[user_id].append(start_msg.message_id)
+    message_ids = await user_cart_messages.get(user_id, [])
+    message_ids.append(start_msg.message_id)
     for item in items:
         msg = await callback.message.answer(text = f"✅ <b>{item.product.name}</b>\n"
                                             f"Количество: <b>{item.quantity}</b> {item.product.unit}\n"
                                             f"Стоимость: <b>{item.total_price:.2f} ₽</b>"
         )
-        user_cart_messages[user_id].append(msg.message_id)
+        message_ids.append(msg.message_id)
     back_msg = await callback.message.answer(text="Для возрата к списку заказов нажмите 👇",
                                              reply_markup=back_kb())
-    user_cart_messages[callback.from_user.id].append(back_msg.message_id)
-    if user_id in user_cart_messages and user_cart_messages[user_id]:
-        # Удаляем и возвращаем первый элемент
-        user_cart_messages[user_id].pop(0)
+    message_ids.append(back_msg.message_id)
+    # Удаляем первый элемент
+    message_ids.pop(0)
+    await user_cart_messages.set(user_id, message_ids)
 
 
 
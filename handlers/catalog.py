@@ -10,44 +10,51 @@ from sqlalchemy.orm import Session
 
 from loguru import logger
 
-from handlers.product_helpers import send_products_batch
-from database.db import get_products_by_category, session
-from keyboards.catalog_control import create_pause_keyboard
+from handlers.product_helpers import close_page_controls, edit_product_card, get_catalog_cursor, show_catalog_page, \
+    catalog_cursors
+from database.db import session
+from keyboards.catalog_control import create_pause_keyboard, create_carousel_keyboard
+from services.catalog_snapshot import catalog_product
 
 router = Router(name='catalog_router')
 
 
+def parse_catalog_callback(data: str) -> tuple[int, int, bool | None]:
+    """'catalog_continue_{category}_{offset}_{in_stock}' -> (category_id, offset, in_stock).
+    В старых сообщениях in_stock нет - тогда None (режим берется из курсора)"""
+    parts = data.split("_")
+    in_stock = parts[4] == "True" if len(parts) > 4 else None
+    return int(parts[2]), int(parts[3]), in_stock
+
+
 # Обработчики навигации по каталогу
 @router.callback_query(F.data.startswith("catalog_continue_"))
 async def handle_continue_catalog(callback: CallbackQuery):
     """Обработчик продолжения просмотра каталога"""
-    _, _, category_id, offset, in_stock = callback.data.split("_")
-    in_stock = bool(in_stock)
     try:
-        category_id = int(category_id)
-        offset = int(offset)
+        category_id, offset, in_stock = parse_catalog_callback(callback.data)
     except Exception as e:
         logger.exception(
             f" Ошибка преобразования ай ди категории в 'handle_continue_catalog': {e}"
         )
         return
 
-    # Удаляем старое сообщение с контролем
-    await callback.message.delete()
-
-    # Получаем товары и показываем следующую порцию
+    # Следующая порция по курсору просмотра
     try:
-        products = get_products_by_category(session, category_id, in_stock)
-        logger.info(
-            f"'catalog.handle_continue_catalo: пользователь {callback.from_user.id} получил данные 'get_products_by_category' "
-        )
+        cursor = await get_catalog_cursor(session, callback.from_user.id, category_id, in_stock)
     except Exception as e:
         logger.exception(
-            f" Запрос пользователя {callback.from_user.id} в БД 'get_products_by_category'"
+            f" Запрос пользователя {callback.from_user.id} в БД 'catalog_products_by_category'"
             f"  в 'catalog.handle_continue_catalog' выполнен неуспешно: {e}"
         )
         return
-    await send_products_batch(callback.message, products, category_id, in_stock, offset)
+    if offset >= len(cursor["ids"]):
+        await callback.answer("🎉 Больше товаров в категории нет")
+        return
+
+    # Убираем навигацию из старого сообщения с контролем
+    await close_page_controls(callback.message)
+    await show_catalog_page(callback.message, session, callback.from_user.id, cursor, offset)
 
     await callback.answer()
 
@@ -55,11 +62,17 @@ async def handle_continue_catalog(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("catalog_pause_"))
 async def handle_pause_catalog(callback: CallbackQuery):
     """Обработчик паузы в просмотре каталога"""
-    _, _, category_id, offset = callback.data.split("_")
+    category_id, offset, in_stock = parse_catalog_callback(callback.data)
+    if in_stock is None:
+        # Старое сообщение без режима - берем его из курсора просмотра
+        cursor = await catalog_cursors.get(callback.from_user.id)
+        in_stock = bool(cursor and cursor["category_id"] == category_id and cursor["in_stock"])
 
-    pause_keyboard = create_pause_keyboard(int(category_id), int(offset))
+    pause_keyboard = create_pause_keyboard(category_id, offset, in_stock)
 
-    await callback.message.edit_text(
+    # Кнопки товаров альбома остаются, пауза - отдельным сообщением
+    await close_page_controls(callback.message)
+    await callback.message.answer(
         "⏸️ <b>Просмотр приостановлен</b>\n\n"
         "Вы можете продолжить просмотр когда будете готовы",
         parse_mode="HTML",
@@ -72,7 +85,7 @@ async def handle_pause_catalog(callback: CallbackQuery):
 @router.callback_query(F.data == "catalog_close")
 async def handle_close_catalog(callback: CallbackQuery):
     """Обработчик закрытия каталога"""
-    await callback.message.delete()
+    await close_page_controls(callback.message)
     await callback.message.answer(
         "👋 <b>Просмотр товаров завершен</b>\n"
         "Возвращайтесь в любое время!",
@@ -84,47 +97,85 @@ async def handle_close_catalog(callback: CallbackQuery):
 @router.callback_query(F.data == "catalog_change_category")
 async def handle_change_category(callback: CallbackQuery):
     """Обработчик смены категории"""
-    await callback.message.edit_text(
-        "🔄 <b>Возврат к выбору категории</b>\n"
-        "Используйте команду /categories для выбора новой категории",
-        parse_mode="HTML"
-    )
+    text = ("🔄 <b>Возврат к выбору категории</b>\n"
+            "Используйте команду /categories для выбора новой категории")
+    await close_page_controls(callback.message)
+    await callback.message.answer(text, parse_mode="HTML")
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("catalog_skip_"))
 async def handle_skip_products(callback: CallbackQuery, session: Session):
     """Обработчик пропуска товаров"""
-    _, _, category_id, offset = callback.data.split("_")
     try:
-        category_id = int(category_id)
+        category_id, offset, in_stock = parse_catalog_callback(callback.data)
     except Exception as e:
         logger.exception(
             f" Ошибка преобразования ай ди категории в 'handle_skip_products': {e}"
         )
         return
-    offset = int(offset)
-
-    # Удаляем старое сообщение с контролем
-    await callback.message.delete()
 
-    # Получаем товары и показываем следующую порцию после пропуска
+    # Порция после пропуска по курсору просмотра
     try:
-        products = get_products_by_category(session, category_id)
-        logger.info(
-        f"'catalog.handle_skip_products: пользователь {callback.from_user.id} получил данные 'get_products_by_category' "
-        )
+        cursor = await get_catalog_cursor(session, callback.from_user.id, category_id, in_stock)
     except Exception as e:
         logger.exception(
-            f" Запрос пользователя {callback.from_user.id} в БД 'get_products_by_category'"
+            f" Запрос пользователя {callback.from_user.id} в БД 'catalog_products_by_category'"
             f"  в 'catalog.handle_skip_products' выполнен неуспешно: {e}"
         )
         return
-    await send_products_batch(callback.message, products, category_id, offset)
+    if offset >= len(cursor["ids"]):
+        await callback.answer("🎉 Больше товаров в категории нет")
+        return
+
+    # Убираем навигацию из старого сообщения с контролем
+    await close_page_controls(callback.message)
+    await show_catalog_page(callback.message, session, callback.from_user.id, cursor, offset)
 
     await callback.answer("🚀 Пропущено 20 товаров")
 
 
+@router.callback_query(F.data.startswith("carousel_cat_"))
+async def handle_carousel_catalog(callback: CallbackQuery):
+    """Обработчик кнопок ◀/▶ карусели товаров категории"""
+    try:
+        _, _, category_id, in_stock, index = callback.data.split("_")
+        category_id = int(category_id)
+        index = int(index)
+    except Exception as e:
+        logger.exception(
+            f" Ошибка разбора callback '{callback.data}' в 'handle_carousel_catalog': {e}"
+        )
+        return
+    in_stock = in_stock == "True"
+
+    try:
+        cursor = await get_catalog_cursor(session, callback.from_user.id, category_id, in_stock)
+    except Exception as e:
+        logger.exception(
+            f" Запрос пользователя {callback.from_user.id} в БД 'catalog_products_by_category'"
+            f"  в 'catalog.handle_carousel_catalog' выполнен неуспешно: {e}"
+        )
+        return
+    ids = cursor["ids"]
+    if not ids:
+        await callback.answer("😔 В этой категории больше нет товаров")
+        return
+
+    index = min(index, len(ids) - 1)
+    product = catalog_product(session, ids[index])
+    if product is None:
+        await callback.answer("Товар больше не продается")
+        return
+    await edit_product_card(
+        callback.message, product, index + 1, len(ids),
+        create_carousel_keyboard(f"carousel_cat_{category_id}_{in_stock}", index, len(ids))
+    )
+    cursor["offset"] = index
+    await catalog_cursors.set(callback.from_user.id, cursor)
+    await callback.answer()
+
+
 @router.callback_query(F.data == "catalog_complete")
 async def handle_catalog_complete(callback: CallbackQuery):
     """Обработчик завершения просмотра всех товаров"""
@@ -12,16 +12,17 @@ from aiogram.types import Message
 
 from loguru import logger
 
-from database.db import session, get_all_categories, search_products, save_question, get_all_admin, get_costumer_id
+from database.db import session, save_question, get_all_admin, get_costumer_id
 
 from handlers.product_helpers import start_category_products
 from handlers.search_helpers import (
     send_search_results_batch, 
     register_search_handlers,
-    search_states,
-    SearchState
+    save_search_state,
 )
 from keyboards.categorieskb import get_categories_kb, get_exit_search_kb, show_in_stock_kb
+from services.catalog_snapshot import catalog_categories, catalog_search
+from services.search_stats import search_stats
 
 router = Router(name='costumer')
 
@@ -81,7 +82,8 @@ async def show_product_bycategory(callback: types.CallbackQuery, state: FSMConte
         return
     my_data = await state.get_data()
     in_stock = my_data['in_stock']
-    await start_category_products(callback.message, category_id, session, in_stock=in_stock)
+    await start_category_products(callback.message, category_id, session, in_stock=in_stock,
+                                  user_id=callback.from_user.id)
     await callback.answer()
 
 
@@ -111,27 +113,24 @@ async def get_search(message: Message, state: FSMContext):
     search_query = message.text.strip()
     # Выполняем поиск товаров
     try:
-        products = search_products(session=session, query=search_query)
+        products = catalog_search(session=session, query=search_query)
         logger.info(
-        f"'costumer.get_search: пользователь {message.from_user.id} получил данные 'search_products' "
+        f"'costumer.get_search: пользователь {message.from_user.id} получил данные 'catalog_search' "
     )
     except Exception as e:
         logger.exception(
-        f" Запрос пользователя {message.from_user.id} в БД 'search_products'"
+        f" Запрос пользователя {message.from_user.id} в БД 'catalog_search'"
         f"в 'costumer.get_search' выполнен неуспешно: {e}"
     )
         return
+    search_stats.record(search_query, found=bool(products))
     if not products:
         await message.answer(f"К сожалению, товары по запросу '{search_query}' не найдены. Попробуйте изменить запрос.",
                              reply_markup=get_exit_search_kb())
         await state.set_state(SearchProduct.search_word)
         return
     # Сохраняем состояние поиска
-    user_id = message.from_user.id
-    search_states[user_id] = SearchState(
-        query=search_query,
-        products=products
-    )
+    await save_search_state(message.from_user.id, search_query, products)
     # Отправляем первую порцию товаров
     await send_search_results_batch(message, products, offset=0)
     await state.clear()
@@ -207,13 +206,13 @@ async def in_stock_category(callback: types.CallbackQuery, state: FSMContext):
     else:
         await state.update_data(in_stock=False)
     try:
-        categories = get_all_categories(session)
+        categories = catalog_categories(session)
         logger.info(
-        "'costumer.in_stock_category:  получены данные 'get_all_categories' "
+        "'costumer.in_stock_category:  получены данные 'catalog_categories' "
         )
     except Exception as e:
         logger.exception(
-        f" Запрос  в БД 'get_all_categories'"
+        f" Запрос  в БД 'catalog_categories'"
         f"в 'in_stock_category' выполнен неуспешно: {e}"
         )
         return
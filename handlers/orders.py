@@ -1,3 +1,4 @@
+from functools import partial
 from typing import Sequence, Any
 
 from aiogram import Router, F, Bot, types
@@ -16,7 +17,6 @@ from database.db import (
     set_active_entity,
     save_product_to_entity,
     get_entity_items,
-    change_item_quantity,
     delete_entity_item,
     confirm_entity,
     get_entity_item,
@@ -37,10 +37,13 @@ from keyboards.carts_kb import (
     back_kb,
 )
 from keyboards.categorieskb import get_categories_kb, show_in_stock_kb
+from services.catalog_snapshot import catalog_product
+from services.quantity_coalescer import quantity_coalescer
+from services.user_store import UserStore
 
 router = Router(name='orders')
 
-user_order_messages = {}
+user_order_messages = UserStore("order_messages")
 
 
 def commit_session(session):
@@ -191,7 +194,7 @@ async def show_order(message: Message):
         )
         return
     # Сохранение списка сообщений пользователя
-    user_order_messages[message.from_user.id] = []
+    message_ids = []
 
     # Вывод всех товаров как отдельные сообщения
     for item in items:
@@ -205,7 +208,7 @@ async def show_order(message: Message):
             reply_markup=item_action_kb(item.id, "OrderItem"),
             parse_mode=ParseMode.HTML
         )
-        user_order_messages[message.from_user.id].append(msg.message_id)
+        message_ids.append(msg.message_id)
 
     # Итоговая кнопка
     final_msg = await message.answer(
@@ -213,78 +216,54 @@ async def show_order(message: Message):
         reply_markup=cart_main_kb(order.id, "Order"),
         parse_mode="Markdown"
     )
-    user_order_messages[message.from_user.id].append(final_msg.message_id)
+    message_ids.append(final_msg.message_id)
+    await user_order_messages.set(message.from_user.id, message_ids)
 
 
 # -------------------------------------------------------
 #               Кнопки + и -
 # -------------------------------------------------------
 
-@router.callback_query(F.data.startswith("OrderItem_plus"))
-async def plus_orderitem(call: CallbackQuery):
-    """Обработка нажатия кнопки увеличения товара в заказе"""
-    _, item_id = call.data.split(":")
-    try:
-        item_id = int(item_id)
-    except Exception as e:
-        logger.exception(
-            f" Запрос пользователя {call.from_user.id} преобразование номера товара {item_id} в целое "
-            f"  в 'plus_orderitem' выполнен неуспешно: {e}"
-        )
-        return
-    try:
-        item = change_item_quantity(session, item_id, +1, OrderItems)
-        logger.info(
-            f"'plus_orderitem':  {call.from_user.id} получил данные 'change_item_quantity' "
-        )
-    except Exception as e:
-        logger.exception(
-            f" Запрос пользователя {call.from_user.id} в БД 'change_item_quantity', номер товара {item_id}' "
-            f"  в 'plus_orderitem' выполнен неуспешно: {e}"
-        )
+async def show_order_item(message: Message, item_id: int, row) -> None:
+    """Обновляет карточку позиции заказа после записи количества"""
+    if row is None:
         return
-    await call.message.edit_text(
-        f"🛍 <b>{item.product.name}</b>\n"
-        f"Количество: <b>{item.quantity}</b> {item.product.unit}\n"
-        f"Стоимость: <b>{item.total_price:.2f} ₽</b>",
-        reply_markup=item_action_kb(item.id, "OrderItem"),
+    product_id, quantity, unit_price = row
+    product = catalog_product(session, product_id)
+    await message.edit_text(
+        f"🛍 <b>{product.name}</b>\n"
+        f"Количество: <b>{quantity}</b> {product.unit}\n"
+        f"Стоимость: <b>{unit_price * quantity:.2f} ₽</b>",
+        reply_markup=item_action_kb(item_id, "OrderItem"),
         parse_mode=ParseMode.HTML
     )
-    await call.answer()
 
 
-@router.callback_query(F.data.startswith("OrderItem_minus"))
-async def minus_orderitem(call: CallbackQuery):
-    """Обработка нажатия кнопки уменьшения товара в заказе"""
+async def change_order_item(call: CallbackQuery, delta: int, handler_name: str):
+    """Отвечает на нажатие сразу, изменение количества копится в quantity_coalescer"""
     _, item_id = call.data.split(":")
     try:
         item_id = int(item_id)
     except Exception as e:
         logger.exception(
             f" Запрос пользователя {call.from_user.id} преобразование номера товара {item_id} в целое "
-            f"  в 'minus_orderitem' выполнен неуспешно: {e}"
+            f"  в '{handler_name}' выполнен неуспешно: {e}"
         )
         return
-    try:
-        item = change_item_quantity(session, item_id, -1, OrderItems)
-        logger.info(
-            f"'minus_orderitem':  {call.from_user.id} получил данные 'change_item_quantity' "
-        )
-    except Exception as e:
-        logger.exception(
-            f" Запрос пользователя {call.from_user.id} в БД 'change_item_quantity', номер товара {item_id}' "
-            f"  в 'minus_orderitem' выполнен неуспешно: {e}"
-        )
-        return
-
-    await call.message.edit_text(
-        f"🛍 <b>{item.product.name}</b>\n"
-        f"Количество: <b>{item.quantity}</b> {item.product.unit}\n"
-        f"Стоимость: <b>{item.total_price:.2f} ₽</b>",
-        reply_markup=item_action_kb(item.id, "OrderItem"),
-        parse_mode=ParseMode.HTML
-    )
     await call.answer()
+    quantity_coalescer.add(OrderItems, item_id, delta, partial(show_order_item, call.message, item_id))
+
+
+@router.callback_query(F.data.startswith("OrderItem_plus"))
+async def plus_orderitem(call: CallbackQuery):
+    """Обработка нажатия кнопки увеличения товара в заказе"""
+    await change_order_item(call, +1, "plus_orderitem")
+
+
+@router.callback_query(F.data.startswith("OrderItem_minus"))
+async def minus_orderitem(call: CallbackQuery):
+    """Обработка нажатия кнопки уменьшения товара в заказе"""
+    await change_order_item(call, -1, "minus_orderitem")
 
 
 # -------------------------------------------------------
@@ -396,14 +375,12 @@ async def confirm_order_handler(call: CallbackQuery):
 
     # Удаляем все сообщения корзины
     user_id = call.from_user.id
-    if user_id in user_order_messages:
-        for mid in user_order_messages[user_id]:
-            try:
-                await call.bot.delete_message(user_id, mid)
-            except:
-                pass
-        del user_order_messages[user_id]
-        # Уведомление админам
+    for mid in await user_order_messages.pop(user_id, []):
+        try:
+            await call.bot.delete_message(user_id, mid)
+        except:
+            pass
+    # Уведомление админам
     try:
         admins = get_all_admin(session)
         logger.info(
@@ -504,13 +481,11 @@ async def delete_order_cancel(call: CallbackQuery):
 async def cleanup_ordermessages(call: CallbackQuery):
     user_id = call.from_user.id
 
-    if user_id in user_order_messages:
-        for mid in user_order_messages[user_id]:
-            try:
-                await call.bot.delete_message(user_id, mid)
-            except:
-                pass
-        del user_order_messages[user_id]
+    for mid in await user_order_messages.pop(user_id, []):
+        try:
+            await call.bot.delete_message(user_id, mid)
+        except:
+            pass
 
     await call.answer("Экран очищен")
 
@@ -520,7 +495,7 @@ async def cleanup_ordermessages(call: CallbackQuery):
 # -------------------------------------------------------
 @router.callback_query(F.data == "previous_order")
 async def show_previus_cart(callback: CallbackQuery):
-    user_order_messages[callback.from_user.id] = []
+    await user_order_messages.set(callback.from_user.id, [])
     try:
         user_id = get_costumer_id(session, callback.from_user.id)
         previous_carts: Sequence[Any] = get_entity_by_user_id(session, user_id, Order)
@@ -555,7 +530,7 @@ async def show_previus_cart(callback: CallbackQuery):
             "Список Ваших заказов:",
             reply_markup=previous_cartlist_kb(previous_carts),
         )
-        user_order_messages[callback.from_user.id].append(callback.message.message_id)
+        await user_order_messages.append(callback.from_user.id, callback.message.message_id)
         await callback.answer()
 
 
@@ -585,19 +560,18 @@ async def show_previus_item(callback: CallbackQuery):
         return
     start_msg = await callback.message.answer(text = f"🛒 <b>Заказ №{cart_id}</b>")
     user_id = callback.from_user.id
-    if user_id not in user_order_messages:
-        user_order_messages[user_id] = []
-    user_order_messages[user_id].append(start_msg.message_id)
+    message_ids = await user_order_messages.get(user_id, [])
+    message_ids.append(start_msg.message_id)
     for item in items:
         msg = await callback.message.answer(text = f"✅ <b>{item.product.name}</b>\n"
                                             f"Количество: <b>{item.quantity}</b> {item.product.unit}\n"
                                             f"Стоимость: <b>{item.total_price:.2f} ₽</b>"
         )
-        user_order_messages[user_id].append(msg.message_id)
+        message_ids.append(msg.message_id)
     back_msg = await callback.message.answer(text="Для возрата к списку заказов нажмите 👇",
                                              reply_markup=back_kb())
-    user_order_messages[callback.from_user.id].append(back_msg.message_id)
-    if user_id in user_order_messages and user_order_messages[user_id]:
-        # Удаляем и возвращаем первый элемент
-        user_order_messages[user_id].pop(0)
+    message_ids.append(back_msg.message_id)
+    # Удаляем первый элемент
+    message_ids.pop(0)
+    await user_order_messages.set(user_id, message_ids)
 
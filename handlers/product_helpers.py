@@ -4,177 +4,371 @@ This module contains helper functions for product handling.
 
 """
 import asyncio
+import html
 
-import requests
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputMediaPhoto, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from database.db import get_products_by_category
-from keyboards.product_cards import create_product_card_keyboard
-from keyboards.catalog_control import create_control_keyboard
+from data.config import CATALOG_VIEW
+from keyboards.product_cards import create_product_card_keyboard, create_page_actions_keyboard
+from keyboards.catalog_control import create_control_keyboard, create_carousel_keyboard
+from services.card_cache import card_render_cache
+from services.catalog_snapshot import catalog_products_by_category, catalog_product
+from services.image_checks import image_checker, is_image_error
+from services.product_images import product_images
+from services.user_store import UserStore
 
 from loguru import logger
 
 PLACEHOLDERIMAGE = "https://disk.yandex.ru/i/686NlpUWze1FLw"
+MEDIA_GROUP_MAX = 10  # ограничение Telegram на число фото в альбоме
 
-async def send_product_card(message, product, index=None, total=None):
-    """Отправляет карточку товара в чат
+async def card_photo(product, use_cache: bool = True) -> tuple[str, str | None]:
+    """Возвращает (photo для answer_photo, ссылка для кэша file_id или None)"""
+    if not product.main_image: #В БД нет кратинки - используем плейсхолдер
+        url = PLACEHOLDERIMAGE
+    elif product.main_image.startswith("http"): #Картинка в виде ссылки на изображение
+        if use_cache:
+            file_id = await product_images.get(product.id, product.main_image)
+            if file_id:
+                return file_id, None
+        url = product.main_image if await image_checker.is_ok(product.main_image) else PLACEHOLDERIMAGE
+    else: # картинка загружена в бот
+        return product.main_image, None
+    file_id = product_images.get_by_url(url) if use_cache else None
+    return (file_id, None) if file_id else (url, url)
+
+
+async def remember_card_photo(product, source_url: str | None, sent) -> None:
+    """Сохраняет file_id картинки, которую Telegram скачал по ссылке"""
+    if source_url is None or not sent.photo:
+        return
+    file_id = sent.photo[-1].file_id
+    if source_url == product.main_image:
+        await product_images.remember(product.id, source_url, file_id)
+    else:
+        product_images.remember_url(source_url, file_id)
+
+
+def _render_card_parts(product):
+    """(заголовок, текст, флаг заказа, флаг описания, ряды кнопок) карточки из кэша или заново"""
+    key = (product.id, product.updated_at)
+    parts = card_render_cache.get(key)
+    if parts is not None:
+        return parts
+
+    # Подготовка данных для описания товаров
+    if product.description:
+        description_preview = product.description[:100] + "..." if len(product.description) > 100 else product.description
+        description_preview = html.escape(description_preview.removeprefix("Описание"))
+        describe = True
+    else:
+        description_preview = "Описание отсутствует"
+        describe = False
+
+    # Подготовка данных для описания цены товара
+    if product.ostatok is None:
+        ost = "Нет в наличии"
+    elif (product.unit or "").lower() not in ["кг", "кг."]:
+        ost = int(product.ostatok)
+    else:
+        ost = product.ostatok
+
+    if ost == "Нет в наличии":
+        output = f"Нет в наличии"
+        to_order = True
+    else:
+        output = f"В наличии: {ost} {product.unit}"
+        to_order = False
+
+    body = (f"📝 {description_preview}\n"
+            f"💵 <b>Цена: {product.price} руб</b>\n"
+            f"📦 <b>{output}</b>")
+    rows = create_product_card_keyboard(product.id, to_order, describe).export()
+    parts = (f"<b>{html.escape(product.name)}</b>", body, to_order, describe, rows)
+    card_render_cache.set(key, parts)
+    return parts
+
+
+def card_caption(product, index=None, total=None) -> tuple[str, bool, bool]:
+    """Текст карточки товара и флаги (заказ вместо корзины, есть описание)
     Args:
-        message: Объект сообщения для ответа
         product: Объект товара
         index: Порядковый номер товара (для прогресса)
         total: Общее количество товаров (для прогресса)
     """
-    try:
-        # Подготовка данных для описания товаров
-        progress_text = f"({index}/{total})" if index and total else ""
-        if product.description:
-            description_preview = product.description[:100] + "..." if len(product.description) > 100 else product.description
-            description_preview = description_preview.removeprefix("Описание")
-            describe = True
-        elif product.description is None or product.description == "":
-            description_preview = "Описание отсутствует"
-            describe = False
-
-        # Подготовка данных для описания цены товара
-        if product.ostatok is None:
-            ost = "Нет в наличии"
-        elif product.unit.lower() not in ["кг", "кг."]:
-            ost = int(product.ostatok)
-        else:
-            ost = product.ostatok
+    title, body, to_order, describe, _ = _render_card_parts(product)
+    progress_text = f"({index}/{total})" if index and total else ""
+    return f"{title} {progress_text}\n\n{body}", to_order, describe
 
-        if ost == "Нет в наличии":
-            output = f"Нет в наличии"
-            to_order = True
-        else:
-            output = f"В наличии: {ost} {product.unit}"
-            to_order = False
 
+def render_product_card(product, index=None, total=None, navigation=None):
+    """Текст и клавиатура карточки товара
+    Args:
+        product: Объект товара
+        index: Порядковый номер товара (для прогресса)
+        total: Общее количество товаров (для прогресса)
+        navigation: InlineKeyboardBuilder, добавляется после кнопок товара
+    Returns:
+        (caption, InlineKeyboardBuilder)
+    """
+    title, body, _, _, rows = _render_card_parts(product)
+    progress_text = f"({index}/{total})" if index and total else ""
+    keyboard = InlineKeyboardBuilder(markup=[list(row) for row in rows])
+    if navigation is not None:
+        keyboard.attach(navigation)
+    return f"{title} {progress_text}\n\n{body}", keyboard
 
 
-        # Проверка валидности картинки товара:
-        if not product.main_image: #В БД нет кратинки - используем плейсхолдер
-            optimized_image = PLACEHOLDERIMAGE
-        elif product.main_image.startswith("http"): #Картинка в виде ссылки на изображение
-            try:
-                response = requests.head(product.main_image, allow_redirects=True)
-                if response.status_code == 200:
-                    optimized_image = product.main_image
-            except Exception as e:
-                optimized_image = PLACEHOLDERIMAGE
-                logger.exception(f"Проблема с загрузкой картинки {e} для {product.id}")
-        else: # картинка загружена в бот
-            optimized_image = product.main_image
-        # optimized_image = product.main_image #TO DO сделать проверку валидности рисунка
-        # photo1 = PLACEHOLDERIMAGE
-
-        keyboard = create_product_card_keyboard(product.id, to_order, describe)
-
+async def send_product_card(message, product, index=None, total=None, navigation=None):
+    """Отправляет карточку товара в чат
+    Args:
+        message: Объект сообщения для ответа
+        product: Объект товара
+        index: Порядковый номер товара (для прогресса)
+        total: Общее количество товаров (для прогресса)
+        navigation: Дополнительные кнопки под кнопками товара (карусель)
+    """
+    caption, keyboard = render_product_card(product, index, total, navigation)
+    try:
         # Отправка карточки
-        await message.answer_photo(
-                photo=optimized_image,
-                caption=f"<b>{product.name}</b> {progress_text}\n\n"
-                        f"📝 {description_preview}\n"
-                        f"💵 <b>Цена: {product.price} руб</b>\n"
-                        f"📦 <b>{output}</b>",
+        photo, source_url = await card_photo(product)
+        try:
+            sent = await message.answer_photo(
+                photo=photo,
+                caption=caption,
                 parse_mode="HTML",
                 reply_markup=keyboard.as_markup(),
                 disable_notification=True
             )
-        # else:
-        #     # Резервный вариант без изображения
-        #     await message.answer_photo(
-        #         photo=PLACEHOLDERIMAGE,
-        #         caption=f"<b>{product.name}</b> {progress_text}\n\n"
-        #                     f"📝 {description_preview}\n"
-        #                     f"💵 <b>Цена: {product.price} руб</b>\n"
-        #                     f"📦 <b>{output}</b>",
-        #         parse_mode="HTML",
-        #         reply_markup=keyboard.as_markup(),
-        #         disable_notification=True
-        #         )
+        except TelegramBadRequest:
+            if source_url is not None or photo == product.main_image:
+                raise
+            # file_id из кэша больше не принимается Telegram - отправляем по ссылке
+            product_images.forget(product.id)
+            photo, source_url = await card_photo(product, use_cache=False)
+            sent = await message.answer_photo(
+                photo=photo,
+                caption=caption,
+                parse_mode="HTML",
+                reply_markup=keyboard.as_markup(),
+                disable_notification=True
+            )
+        await remember_card_photo(product, source_url, sent)
 
     except Exception as e:
         logger.exception(f"Ошибка отправки карточки товара {product.id}: {e}")
-        # Аварийный вариант
-        keyboard = create_product_card_keyboard(product.id, to_order, describe)
+        # Аварийный вариант без картинки
         await message.answer(
-            f"<b>{product.name}</b>\n"
-            f"💵 <b>Цена: {product.price} руб</b>\n"
-            f"📦 <b>{output}</b>",
+            caption,
             parse_mode="HTML",
             reply_markup=keyboard.as_markup(),
             disable_notification=True
         )
 
 
-async def send_products_batch(message, products, category_id, in_stock, offset=0, batch_size=5):
+async def edit_product_card(message, product, index, total, navigation) -> None:
+    """Заменяет фото, текст и кнопки сообщения-карусели на карточку другого товара.
+    Картинку, которую Telegram не принял, заменяет плейсхолдер"""
+    caption, keyboard = render_product_card(product, index, total, navigation)
+    photo, source_url = await card_photo(product)
+    while True:
+        try:
+            edited = await message.edit_media(
+                media=InputMediaPhoto(media=photo, caption=caption, parse_mode="HTML"),
+                reply_markup=keyboard.as_markup()
+            )
+            break
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return
+            # Ошибки сообщения (не найдено, разметка) к картинке отношения не имеют
+            if not is_image_error(e) or photo == PLACEHOLDERIMAGE:
+                raise
+            if source_url is None and photo != product.main_image:
+                # file_id из кэша больше не принимается Telegram - меняем по ссылке
+                product_images.forget(product.id)
+                photo, source_url = await card_photo(product, use_cache=False)
+            else:
+                logger.warning(f"Telegram не принял картинку товара {product.id}: {e}")
+                if source_url == product.main_image:
+                    await image_checker.mark_broken(source_url)
+                photo, source_url = PLACEHOLDERIMAGE, PLACEHOLDERIMAGE
+    if isinstance(edited, Message):
+        await remember_card_photo(product, source_url, edited)
+
+
+async def send_products_page(message, products, offset: int, total: int, text: str, navigation) -> None:
+    """Отправляет страницу товаров одним альбомом и одно сообщение с кнопками
+    Args:
+        message: Объект сообщения для ответа
+        products: Товары страницы (не больше MEDIA_GROUP_MAX)
+        offset: Смещение страницы в общем списке
+        total: Общее количество товаров
+        text: Текст сообщения с кнопками
+        navigation: InlineKeyboardBuilder с навигацией, добавляется после кнопок товаров
+    """
+    if CATALOG_VIEW == "album" and 1 < len(products) <= MEDIA_GROUP_MAX:
+        captions = [card_caption(product, offset + i, total) for i, product in enumerate(products, 1)]
+        photos = await asyncio.gather(*(card_photo(product) for product in products))
+        try:
+            sent = await message.answer_media_group(
+                media=[InputMediaPhoto(media=photo, caption=caption, parse_mode="HTML")
+                       for (photo, _), (caption, _, _) in zip(photos, captions)],
+                disable_notification=True
+            )
+        except TelegramBadRequest as e:
+            # Одна недоступная картинка или file_id ломает весь альбом - отправляем карточками
+            logger.warning(f"Альбом товаров не отправлен, отправляем карточками: {e}")
+            for i, product in enumerate(products, 1):
+                await send_product_card(message, product, offset + i, total)
+        else:
+            for product, (_, source_url), msg in zip(products, photos, sent):
+                await remember_card_photo(product, source_url, msg)
+            keyboard = create_page_actions_keyboard(
+                [(offset + i, product.id, to_order, describe)
+                 for i, (product, (_, to_order, describe)) in enumerate(zip(products, captions), 1)]
+            )
+            keyboard.attach(navigation)
+            names = "\n".join(f"{offset + i}. {html.escape(product.name)}" for i, product in enumerate(products, 1))
+            await message.answer(
+                f"{names}\n\n{text}",
+                parse_mode="HTML",
+                reply_markup=keyboard.as_markup(),
+                disable_notification=True
+            )
+            return
+    else:
+        for i, product in enumerate(products, 1):
+            await send_product_card(message, product, offset + i, total)
+
+    if not navigation.export():
+        return
+    await message.answer(
+        text,
+        parse_mode="HTML",
+        reply_markup=navigation.as_markup(),
+        disable_notification=True
+    )
+
+
+PAGE_ACTION_PREFIXES = ("add_to_cart_", "add_to_order_", "description_")
+
+
+async def close_page_controls(message) -> None:
+    """Убирает навигацию из сообщения с кнопками страницы.
+    Кнопки товаров альбома остаются, сообщение без них удаляется"""
+    markup = message.reply_markup
+    rows = [row for row in markup.inline_keyboard
+            if all((button.callback_data or "").startswith(PAGE_ACTION_PREFIXES) for button in row)] if markup else []
+    try:
+        if rows:
+            await message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+        else:
+            await message.delete()
+    except TelegramBadRequest as e:
+        logger.warning(f"Сообщение с навигацией {message.message_id} не изменено: {e}")
+
+
+async def send_products_batch(message, products, category_id, in_stock, offset=0, batch_size=5, total=None):
     """
     Отправляет порцию товаров с контролем продолжения
     Args:
         message: Объект сообщения для ответа
-        products: Полный список товаров категории
+        products: Полный список товаров категории, либо, если передан total, только товары текущей порции
         category_id: ID текущей категории
         offset: Смещение для текущей порции
         batch_size: Размер порции товаров
-        in_stock
+        in_stock: Тру если показывается только товар в наличии
+        total: Общее количество товаров категории
     """
-    # Текущая порция товаров
-    current_batch = products[offset:offset + batch_size]
-    total_products = len(products)
+    if total is None:
+        total_products = len(products)
+        current_batch = products[offset:offset + batch_size]
+    else:
+        total_products = total
+        current_batch = products
+    if not current_batch:
+        return
 
-    # Отправка товаров текущей порции
-    for i, product in enumerate(current_batch):
-        current_index = offset + i + 1
-        await send_product_card(message, product, current_index, total_products)
+    if CATALOG_VIEW == "carousel":
+        index = min(offset, total_products - 1)
+        await send_product_card(message, current_batch[0], index + 1, total_products,
+                                create_carousel_keyboard(f"carousel_cat_{category_id}_{in_stock}", index, total_products))
+        return
 
-        # Небольшая пауза между карточками для лучшего UX
-        if i < len(current_batch) - 1:
-            await asyncio.sleep(0.3)
+    control_keyboard = create_control_keyboard(
+        category_id, offset, total_products, batch_size, in_stock
+    )
+    await send_products_page(message, current_batch, offset, total_products,
+                             control_text(offset, total_products, batch_size), control_keyboard)
 
-    # Отправка контроллера навигации
-    await send_control_message(message, category_id, offset, total_products, batch_size, in_stock)
 
+# Курсор просмотра категории: {"category_id", "in_stock", "ids": id товаров по порядку, "offset"}
+catalog_cursors = UserStore("catalog_cursor")
 
-async def send_control_message(message, category_id, current_offset, total_products, batch_size=5, in_stock:bool = False):
-    """
-    Отправляет сообщение с управлением просмотром
-    """
-    control_keyboard = create_control_keyboard(
-        category_id, current_offset, total_products, batch_size, in_stock
-    )
 
-    progress_text = (
-        f"📊 <b>Прогресс просмотра:</b> {current_offset + batch_size}/{total_products} товаров\n\n"
-        "Выберите действие:"
-    )
+async def open_catalog_cursor(user_id: int, category_id: int, in_stock: bool, products) -> dict:
+    """Запоминает порядок товаров категории для листания"""
+    cursor = {"category_id": category_id, "in_stock": in_stock, "ids": [product.id for product in products],
+              "offset": 0}
+    await catalog_cursors.set(user_id, cursor)
+    return cursor
 
-    await message.answer(
-        progress_text,
-        parse_mode="HTML",
-        reply_markup=control_keyboard.as_markup(),
-        disable_notification=True
+
+async def get_catalog_cursor(session, user_id: int, category_id: int, in_stock: bool | None = None) -> dict:
+    """Курсор пользователя по категории.
+    Если курсор истек или открыт для другой категории (старое сообщение), он создается заново.
+    in_stock=None - режим из курсора, а для нового курсора - все товары"""
+    cursor = await catalog_cursors.get(user_id)
+    if cursor and cursor["category_id"] == category_id and in_stock in (None, cursor["in_stock"]):
+        return cursor
+    in_stock = bool(in_stock)
+    products = catalog_products_by_category(session, category_id, in_stock)
+    logger.info(f"Курсор каталога пользователя {user_id} для категории {category_id} создан заново")
+    return await open_catalog_cursor(user_id, category_id, in_stock, products)
+
+
+async def show_catalog_page(message, session, user_id: int, cursor: dict, offset: int, batch_size: int = 5) -> None:
+    """Сдвигает курсор на offset и показывает товары страницы"""
+    ids = cursor["ids"]
+    cursor["offset"] = offset
+    await catalog_cursors.set(user_id, cursor)
+    page_size = 1 if CATALOG_VIEW == "carousel" else batch_size
+    page = [product for product in (catalog_product(session, product_id) for product_id in ids[offset:offset + page_size])
+            if product is not None]
+    await send_products_batch(message, page, cursor["category_id"], cursor["in_stock"], offset, batch_size,
+                              total=len(ids))
+
+
+def control_text(current_offset, total_products, batch_size=5) -> str:
+    """Текст сообщения с управлением просмотром"""
+    return (
+        f"📊 <b>Прогресс просмотра:</b> {min(current_offset + batch_size, total_products)}/{total_products} товаров\n\n"
+        "Выберите действие:"
     )
 
 
-async def start_category_products(message, category_id, session, in_stock: bool):
+async def start_category_products(message, category_id, session, in_stock: bool, user_id: int | None = None):
     """ Начинает показ товаров выбранной категории
     Args:
         message: Объект сообщения
         category_id: ID выбранной категории
         session: Сессия базы данных
         in_stock: Тру если показывается только товар в наличии
+        user_id: ID пользователя для курсора просмотра (по умолчанию ID чата)
     """
+    user_id = user_id or message.chat.id
     # Получаем товары категории
-    user = message.from_user
-    chat = message.chat
     try:
-        products = get_products_by_category(session, category_id, in_stock)
+        products = catalog_products_by_category(session, category_id, in_stock)
         logger.info(
-            f"'start_category_products':  {message.from_user.id} получил данные 'get_products_by_category' "
+            f"'start_category_products':  {user_id} получил данные 'catalog_products_by_category' "
         )
     except Exception as e:
         logger.exception(
-            f" Запрос пользователя {message.from_user.id} в БД 'get_products_by_category' "
+            f" Запрос пользователя {user_id} в БД 'catalog_products_by_category' "
             f"  в 'start_category_products' выполнен неуспешно: {e}"
         )
         return
@@ -192,4 +386,5 @@ async def start_category_products(message, category_id, session, in_stock: bool)
     )
 
     # Запускаем показ первой порции
-    await send_products_batch(message, products, category_id, in_stock, offset=0)
+    cursor = await open_catalog_cursor(user_id, category_id, in_stock, products)
+    await show_catalog_page(message, session, user_id, cursor, offset=0)
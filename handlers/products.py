@@ -3,22 +3,37 @@
 This module contains handlers for product interactions.
 
 """
-import json
+import html
 
 from aiogram import Router, F, types
 from aiogram.types import CallbackQuery
 from sqlalchemy.exc import SQLAlchemyError
 
-from database.db import get_product_description, session
+from database.db import session
 from keyboards.describe_kb import create_describe_keyboard
+from services.catalog_snapshot import catalog_product
 from services.search import clean_description
+from services.user_store import UserStore
 from loguru import logger
 
 router = Router(name='products_router')
 
-message_store = {}
+# Открытые описания товаров пользователя: {id сообщения описания: id сообщения с фото}
+description_messages = UserStore("description_messages")
+MAX_OPEN_DESCRIPTIONS = 20
 
 
+def characteristics_text(characteristics) -> str:
+    """Строки характеристик для описания. Кроме dict в JSONB бывают список и
+    строка (старые значения не в формате JSON) - они выводятся как есть"""
+    if isinstance(characteristics, dict):
+        lines = [f"{k} - {v}" for k, v in characteristics.items()]
+    elif isinstance(characteristics, list):
+        lines = [str(item) for item in characteristics]
+    else:
+        lines = [str(characteristics)]
+    return "".join(f"\n {html.escape(line)}" for line in lines)
+
 
 
 # Обработчики действий с товарами
@@ -39,26 +54,25 @@ async def show_description(callback: CallbackQuery):
     else:
         order = False
     try:
-        product = get_product_description(session, product_id)
+        product = catalog_product(session, product_id)
         logger.info(
-            f"'show_description':  {callback.from_user.id} получил данные 'get_product_description' "
+            f"'show_description':  {callback.from_user.id} получил данные 'catalog_product' "
         )
     except Exception as e:
         logger.exception(
-            f" Запрос пользователя {callback.from_user.id} в БД 'get_product_description' "
+            f" Запрос пользователя {callback.from_user.id} в БД 'catalog_product' "
             f"  в 'show_description' выполнен неуспешно: {e}"
         )
         return
 
     description = clean_description(product.description)
-    if len(product.characteristics) > 2:
-        description += "\nХарактеристики:"
-        opisan = json.loads(product.characteristics)
-        for k, v in opisan.items():
-            description += f"\n {k} - {v}"
+    if product.characteristics:
+        description += "\nХарактеристики:" + characteristics_text(product.characteristics)
     photo_msg = await callback.message.answer_photo(photo=product.image, caption=f"{product.name},\n<b>💰цена: {product.price} руб.</b>")
     desc_msg = await callback.message.answer(text= description, parse_mode="HTML", reply_markup=create_describe_keyboard(product_id, order).as_markup())
-    message_store["msg_id"] = [photo_msg.message_id, desc_msg.message_id]
+    opened = await description_messages.get(callback.from_user.id, {})
+    opened[str(desc_msg.message_id)] = photo_msg.message_id
+    await description_messages.set(callback.from_user.id, dict(list(opened.items())[-MAX_OPEN_DESCRIPTIONS:]))
     await callback.answer("Важное сообщение!", show_alert=False)
 
 
@@ -67,15 +81,15 @@ async def close_describe(callback: types.CallbackQuery):
     """Callback handler to close the description of a product.
         Deletes the photo and description messages associated with the product.
     """
-    msg_ids = message_store["msg_id"]
-    if msg_ids:
-        photo_id, desc_id = msg_ids
-    try:
-        await callback.bot.delete_message(chat_id=callback.message.chat.id, message_id=photo_id)
-        await callback.bot.delete_message(chat_id=callback.message.chat.id, message_id=desc_id)
-    except Exception as e:
-        print(e, "message not deleted")
-    del message_store["msg_id"]
+    opened = await description_messages.get(callback.from_user.id, {})
+    photo_id = opened.pop(str(callback.message.message_id), None)
+    await description_messages.set(callback.from_user.id, opened)
+    msg_ids = [photo_id, callback.message.message_id] if photo_id else [callback.message.message_id]
+    for message_id in msg_ids:
+        try:
+            await callback.bot.delete_message(chat_id=callback.message.chat.id, message_id=message_id)
+        except Exception as e:
+            print(e, "message not deleted")
 
 
 @router.callback_query(F.data.startswith("quick_order_"))
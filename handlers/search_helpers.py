@@ -3,38 +3,46 @@ Module handlers.search_helpers
 
 This module contains helper functions for handling search functionality.
 """
-import asyncio
 from typing import List
 
 from aiogram import F
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from data.config import CATALOG_VIEW
 from database.db import session, search_products
-from handlers.product_helpers import send_product_card
-
-
-async def send_search_results_batch(message: Message, products: List, offset: int = 0, batch_size: int = 5):
-    """Отправляет порцию результатов поиска"""
-    current_batch = products[offset:offset + batch_size]
-    total_products = len(products)
-    
-    # Отправляем товары текущей порции
-    for i, product in enumerate(current_batch, 1):
-        current_index = offset + i
-        await send_product_card(message, product, current_index, total_products)
-        
-        # Небольшая пауза между карточками для лучшего UX
-        if i < len(current_batch):
-            await asyncio.sleep(0.3)
+from handlers.product_helpers import send_products_page, close_page_controls, send_product_card, edit_product_card
+from keyboards.catalog_control import create_carousel_keyboard
+from services.catalog_snapshot import catalog_product
+from services.user_store import UserStore
+
+
+async def send_search_results_batch(message: Message, products: List, offset: int = 0, batch_size: int = 5,
+                                    total: int | None = None):
+    """Отправляет порцию результатов поиска.
+    products - все результаты, либо, если передан total, только товары текущей порции"""
+    if total is None:
+        current_batch = products[offset:offset + batch_size]
+        total_products = len(products)
+    else:
+        current_batch = products
+        total_products = total
     
-    # Отправляем контроллер навигации, если есть что листать
-    if len(products) > batch_size:
-        keyboard = create_search_navigation_keyboard(offset, len(products), batch_size)
-        await message.answer(
-            f"Страница {offset // batch_size + 1} из {(len(products) - 1) // batch_size + 1}",
-            reply_markup=keyboard.as_markup()
-        )
+    if CATALOG_VIEW == "carousel" and current_batch:
+        await send_product_card(message, current_batch[0], offset + 1, total_products,
+                                create_carousel_keyboard("carousel_search", offset, total_products,
+                                                         change_category=False))
+        return
+
+    keyboard = create_search_navigation_keyboard(offset, total_products, batch_size)
+    await send_products_page(
+        message,
+        current_batch,
+        offset,
+        total_products,
+        f"Страница {offset // batch_size + 1} из {(total_products - 1) // batch_size + 1}",
+        keyboard
+    )
 
 
 def create_search_navigation_keyboard(current_offset: int, total_products: int, batch_size: int = 5):
@@ -57,16 +65,13 @@ def create_search_navigation_keyboard(current_offset: int, total_products: int,
     return keyboard
 
 
-class SearchState:
-    """Класс для хранения состояния поиска"""
-    def __init__(self, query: str, products: list):
-        self.query = query
-        self.products = products
-        self.offset = 0
+# Результаты последнего поиска пользователя: {"query": запрос, "ids": [id товаров]}
+search_states = UserStore("search_results")
 
 
-# Глобальный словарь для хранения состояния поиска (временное решение)
-search_states = {}
+async def save_search_state(user_id: int, query: str, products: list) -> None:
+    """Сохраняет запрос и id найденных товаров для листания результатов"""
+    await search_states.set(user_id, {"query": query, "ids": [product.id for product in products]})
 
 
 def register_search_handlers(router):
@@ -75,11 +80,11 @@ def register_search_handlers(router):
     async def handle_search_navigation(callback: CallbackQuery):
         """Обработка навигации по результатам поиска"""
         user_id = callback.from_user.id
-        if user_id not in search_states:
+        search_state = await search_states.get(user_id)
+        if not search_state:
             await callback.answer("Сессия поиска истекла. Пожалуйста, выполните поиск снова.")
             return
 
-        search_state = search_states[user_id]
         # Разбираем callback_data в формате 'search_prev_10' или 'search_next_10'
         parts = callback.data.split('_')
         if len(parts) >= 3:  # Если формат правильный: ['search', 'prev', '10']
@@ -87,16 +92,35 @@ def register_search_handlers(router):
         else:
             offset = 0  # Значение по умолчанию, если что-то пошло не так
 
-        # Удаляем предыдущее сообщение с пагинацией
-        try:
-            await callback.message.delete()
-        except Exception as e:
-            print(f"Ошибка при удалении сообщения: {e}")
+        # Убираем навигацию из предыдущего сообщения с пагинацией
+        await close_page_controls(callback.message)
 
         # Отправляем новую порцию товаров
+        ids = search_state["ids"]
+        page = [catalog_product(session, product_id) for product_id in ids[offset:offset + 5]]
         await send_search_results_batch(
             callback.message,
-            search_state.products,
-            offset=offset
+            [product for product in page if product is not None],
+            offset=offset,
+            total=len(ids)
+        )
+        await callback.answer()
+
+    @router.callback_query(F.data.startswith('carousel_search_'))
+    async def handle_search_carousel(callback: CallbackQuery):
+        """Обработка кнопок ◀/▶ карусели результатов поиска"""
+        search_state = await search_states.get(callback.from_user.id)
+        if not search_state:
+            await callback.answer("Сессия поиска истекла. Пожалуйста, выполните поиск снова.")
+            return
+        ids = search_state["ids"]
+        index = min(int(callback.data.split('_')[-1]), len(ids) - 1)
+        product = catalog_product(session, ids[index])
+        if product is None:
+            await callback.answer("Товар больше не продается")
+            return
+        await edit_product_card(
+            callback.message, product, index + 1, len(ids),
+            create_carousel_keyboard("carousel_search", index, len(ids), change_category=False)
         )
         await callback.answer()
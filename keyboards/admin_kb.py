@@ -31,6 +31,10 @@ def main_kb() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="Рассылка", callback_data="mailing"),
         InlineKeyboardButton(text="Upload to Excel", callback_data="upload_xlsx"),
         InlineKeyboardButton(text="Get log file", callback_data="get_log"),
+        InlineKeyboardButton(text="📈 Метрики БД", callback_data="db_stats"),
+        InlineKeyboardButton(text="📊 Активность", callback_data="activity_stats"),
+        InlineKeyboardButton(text="👥 DAU/WAU/MAU", callback_data="unique_users"),
+        InlineKeyboardButton(text="🔎 Поисковые запросы", callback_data="search_stats"),
         InlineKeyboardButton(text="Посмотреть админов", callback_data="view_admins"),
         InlineKeyboardButton(text="Просмотр/Изменение товара", callback_data="view_product"))
 
@@ -32,14 +32,14 @@ def create_control_keyboard(category_id: int, current_offset: int, total_product
         # Дополнительные опции
         builder.button(
             text="⏸️ Сделать паузу",
-            callback_data=f"catalog_pause_{category_id}_{current_offset}"
+            callback_data=f"catalog_pause_{category_id}_{current_offset}_{in_stock}"
         )
 
         # Быстрая навигация для больших каталогов
         if total_products > 20:
             builder.button(
                 text="🚀 Пропустить 20 товаров",
-                callback_data=f"catalog_skip_{category_id}_{current_offset + 20}"
+                callback_data=f"catalog_skip_{category_id}_{current_offset + 20}_{in_stock}"
             )
     else:
         # Все товары просмотрены
@@ -73,7 +73,7 @@ def create_control_keyboard(category_id: int, current_offset: int, total_product
     return builder
 
 
-def create_pause_keyboard(category_id: int, current_offset: int):
+def create_pause_keyboard(category_id: int, current_offset: int, in_stock: bool = False):
     """
     Создает клавиатуру для режима паузы
     """
@@ -81,7 +81,7 @@ def create_pause_keyboard(category_id: int, current_offset: int):
 
     builder.button(
         text="▶️ Продолжить просмотр",
-        callback_data=f"catalog_continue_{category_id}_{current_offset}"
+        callback_data=f"catalog_continue_{category_id}_{current_offset}_{in_stock}"
     )
     builder.button(
         text="📂 Выбрать другую категорию",
@@ -93,4 +93,48 @@ def create_pause_keyboard(category_id: int, current_offset: int):
     )
 
     builder.adjust(1, 2)
-    return builder
\ No newline at end of file
+    return builder
+
+def create_carousel_keyboard(prefix: str, index: int, total_products: int, change_category: bool = True):
+    """
+    Создает кнопки карусели: одно сообщение, товар меняется кнопками ◀/▶
+    Args:
+        prefix: начало callback_data, к нему добавляется номер товара (с 0)
+        index: номер текущего товара (с 0)
+        total_products: общее количество товаров
+        change_category: показывать кнопку смены категории (не нужна для поиска)
+    Returns:
+        InlineKeyboardBuilder с кнопками управления
+    """
+    builder = InlineKeyboardBuilder()
+
+    # Листание по кругу
+    if total_products > 1:
+        builder.button(
+            text="◀",
+            callback_data=f"{prefix}_{(index - 1) % total_products}"
+        )
+        builder.button(
+            text="▶",
+            callback_data=f"{prefix}_{(index + 1) % total_products}"
+        )
+
+    if change_category:
+        builder.button(
+            text="📂 Сменить категорию",
+            callback_data="catalog_change_category"
+        )
+    builder.button(
+        text="🛒 Перейти в корзину",
+        callback_data="cart_show"
+    )
+    builder.button(
+        text="❌ Закрыть каталог",
+        callback_data="catalog_close"
+    )
+
+    if total_products > 1:
+        builder.adjust(2, 2, 1)
+    else:
+        builder.adjust(2, 1)
+    return builder
@@ -3,6 +3,7 @@
 This module contains functions for creating keyboard layouts for product cards.
 
 """
+from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 
@@ -51,6 +52,27 @@ def create_product_card_keyboard(product_id: int, order: bool, describe: bool):
     return builder
 
 
+def create_page_actions_keyboard(items: list[tuple[int, int, bool, bool]]):
+    """
+    Создает кнопки товаров страницы, отправленной альбомом (у альбома нет своих кнопок)
+    Args:
+        items: (номер товара в списке, ID товара, флаг заказа, флаг описания) для каждого товара
+    Returns:
+        InlineKeyboardBuilder, по ряду кнопок на товар
+    """
+    builder = InlineKeyboardBuilder()
+    for index, product_id, order, describe in items:
+        if order:
+            buttons = [InlineKeyboardButton(text=f"⚡ Заказать №{index}", callback_data=f"add_to_order_{product_id}")]
+        else:
+            buttons = [InlineKeyboardButton(text=f"🛒 В корзину №{index}", callback_data=f"add_to_cart_{product_id}")]
+        if describe:
+            buttons.append(InlineKeyboardButton(text=f"📰 Подробнее №{index}",
+                                                callback_data=f"description_{product_id}_{order}"))
+        builder.row(*buttons)
+    return builder
+
+
 def create_product_details_keyboard(product_id: int):
     """
     Создает расширенную клавиатуру для детального просмотра товара
@@ -1,4 +1,7 @@
 import asyncio
+import multiprocessing
+import os
+import signal
 
 from aiogram import Bot, Dispatcher, BaseMiddleware
 from aiogram.client.default import DefaultBotProperties
@@ -8,13 +11,29 @@ from loguru import logger
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from data.config import (BOT_TOKEN, YANDEX_TOKEN, REMOTE_FOLDER,
-                         DB_NAME, DB_USER, DB_HOST, DB_PORT, DB_PASSWORD, DB_BACKUP_DIR)
+                         DB_NAME, DB_USER, DB_HOST, DB_PORT, DB_PASSWORD, DB_BACKUP_DIR,
+                         METRICS_HOST, METRICS_PORT, FSM_STORAGE, FSM_TTL, BOT_MODE, WEBHOOK_WORKERS,
+                         UPDATE_CONCURRENCY)
 from handlers import user_start, costumer, products, catalog, admin, orders, carts, admin_recovery, admin_analitics, \
     admin_product, admin_setadmin
-from middleware.db import DBSessionMiddleware
-from middleware.user_activity import UserActivityMiddleware
+from middleware.bot_rate_limit import BotRateLimiter
+from middleware.metrics import MetricsMiddleware
+from middleware.throttling import ThrottlingMiddleware
+from middleware.update_context import UpdateContextMiddleware
+from services.activity_writer import activity_writer
 from services.backup_db import PostrgresBackup
+from services.background_jobs import start_background_jobs, persist_unique_users, persist_search_stats
+from database.db import engine
+from services.catalog_snapshot import refresh_catalog_snapshot
+from services.fsm_storage import PostgresStorage
+from services.image_checks import image_checker
+from services.invalidation import InvalidationListener
+from services.metrics_server import start_metrics_server
+from services.quantity_coalescer import quantity_coalescer
 from services.setup_log import setup_logging
+from services.update_ordering import ChatOrderingIsolation
+from services.user_store import configure_user_stores
+from services.webhook import run_webhook
 
 from services.setup_scheduler import start_sheduler
 from services.yandex_db import YandexDiskBackup, BackupManager
@@ -24,16 +43,19 @@ async def on_startup(bot):
     await start_sheduler(bot)
 
 
-async def main():
-    """
-    Main function of the bot.
-    This function creates a bot instance, sets up a dispatcher and starts polling.
-    """
-    storage = MemoryStorage()
-    setup_logging()
+def create_dispatcher() -> tuple[Bot, Dispatcher]:
+    """Creates the bot and a dispatcher with storage, routers and middlewares."""
+    # Общее хранилище FSM нужно для нескольких процессов бота
+    storage = PostgresStorage(engine, ttl=FSM_TTL) if FSM_STORAGE == "postgres" else MemoryStorage()
     bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # Все запросы бота к Telegram проходят через общий ограничитель частоты
+    bot.session.middleware(BotRateLimiter())
 
-    dp = Dispatcher(storage=storage)
+    if UPDATE_CONCURRENCY:
+        dp = Dispatcher(storage=storage, events_isolation=ChatOrderingIsolation(UPDATE_CONCURRENCY))
+    else:
+        dp = Dispatcher(storage=storage)
+    configure_user_stores(storage, bot.id)
     # Добавляем объект YandexDiskBackup в dispatcher
     dp["ya"] = YandexDiskBackup(YANDEX_TOKEN, REMOTE_FOLDER)
     #Добавляем объект PostrgresBackup в dispatcher
@@ -53,30 +75,85 @@ async def main():
     dp.include_router(admin_analitics.router)
     dp.include_router(admin_product.router)
     dp.include_router(admin_setadmin.router)
-    routers = [
-        user_start.router,
-        products.router,
-        catalog.router,
-        admin.router,
-        carts.router,
-        orders.router,
-        costumer.router,
-        admin_recovery.router,
-        admin_analitics.router,
-        admin_product.router,
-        admin_setadmin.router
-    ]
-    for r in routers:
-        r.message.middleware(DBSessionMiddleware())
-        r.callback_query.middleware(DBSessionMiddleware())
-        r.message.middleware(UserActivityMiddleware())
-        r.callback_query.middleware(UserActivityMiddleware())
+    # Middleware диспетчера применяются ко всем вложенным роутерам
+    throttling = ThrottlingMiddleware()
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(MetricsMiddleware())
+        observer.middleware(throttling)
+        observer.middleware(UpdateContextMiddleware())
+    return bot, dp
 
-    await start_sheduler(bot)
-    logger.info("Бот запущен")
-    await dp.start_polling(bot)
 
+async def run_bot(worker_index: int = 0):
+    """Runs one bot process.
+
+    Worker 0 is the primary process: it runs the scheduler, maintenance jobs
+    and registers the webhook. In webhook mode every worker serves
+    WEBHOOK_PATH on the same port (SO_REUSEPORT), in polling mode only worker 0 exists.
+    """
+    primary = worker_index == 0
+    bot, dp = create_dispatcher()
+    if primary:
+        await start_sheduler(bot)
+    start_background_jobs(bot, primary=primary)
+    await refresh_catalog_snapshot()
+    listener = InvalidationListener(engine)
+    await listener.start()
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + worker_index if METRICS_PORT else 0)
+    await activity_writer.start()
+    logger.info(f"Бот запущен в режиме {BOT_MODE}, процесс {worker_index}")
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp, primary=primary)
+        else:
+            # getUpdates не работает, пока установлен webhook
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
+    finally:
+        await quantity_coalescer.flush_all()
+        await activity_writer.stop()
+        await persist_unique_users()
+        await persist_search_stats()
+        await listener.stop()
+        await image_checker.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+
+
+def run_worker(worker_index: int):
+    """Entry point of an additional webhook worker process"""
+    setup_logging()
+    asyncio.run(run_bot(worker_index))
+
+
+async def main():
+    """
+    Main function of the bot.
+    Starts polling, or the webhook server with WEBHOOK_WORKERS processes.
+    """
+    setup_logging()
+    workers = []
+    if BOT_MODE == "webhook" and WEBHOOK_WORKERS > 1:
+        if FSM_STORAGE != "postgres":
+            logger.warning("Несколько webhook процессов с FSM_STORAGE=memory: состояние FSM не общее")
+        context = multiprocessing.get_context("spawn")
+        for index in range(1, WEBHOOK_WORKERS):
+            process = context.Process(target=run_worker, args=(index,), name=f"bot-worker-{index}")
+            process.start()
+            workers.append(process)
+    try:
+        await run_bot(0)
+    finally:
+        # SIGINT - штатная остановка asyncio.run с записью буферов в БД
+        for process in workers:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        for process in workers:
+            process.join(timeout=15)
+            if process.is_alive():
+                process.terminate()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
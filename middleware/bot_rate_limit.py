@@ -0,0 +1,96 @@
+# middleware/bot_rate_limit.py
+import asyncio
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from loguru import logger
+
+from data.config import (BOT_RATE_GLOBAL, BOT_RATE_PRIVATE, BOT_RATE_GROUP, BOT_RATE_RETRIES, THROTTLE_USERS_MAX,
+                         BOT_MODE, WEBHOOK_WORKERS)
+from services.metrics import Counter, Gauge
+from utils.token_bucket import TokenBucket, BucketRegistry, parse_rate
+
+# Методы, которые Telegram ограничивает по частоте: отправка и изменение сообщений
+LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+
+bot_requests_limited = Counter("shefport_bot_requests_delayed_total", "Bot API requests delayed by the rate limiter")
+bot_retry_after = Counter("shefport_bot_retry_after_total", "Bot API requests answered with retry_after",
+                          ("method",))
+
+
+class BotRateLimiter(BaseRequestMiddleware):
+    """Ограничение частоты запросов к Bot API на сессии бота.
+
+    Перед отправкой запрос ждет токен общей корзины и корзины чата (личный
+    чат или группа - разные лимиты); альбом стоит столько токенов, сколько в
+    нем фото. Корзины живут в памяти процесса, поэтому общий лимит делится на
+    число процессов workers. Ответ retry_after ставит на паузу корзину чата
+    (общую - только для запросов без чата) и повторяет запрос не более
+    BOT_RATE_RETRIES раз. Число ждущих запросов видно в метрике shefport_bot_requests_waiting.
+    """
+
+    def __init__(self, global_rate: str = BOT_RATE_GLOBAL, private_rate: str = BOT_RATE_PRIVATE,
+                 group_rate: str = BOT_RATE_GROUP, retries: int = BOT_RATE_RETRIES,
+                 max_chats: int = THROTTLE_USERS_MAX,
+                 workers: int = WEBHOOK_WORKERS if BOT_MODE == "webhook" else 1):
+        rate, burst = parse_rate(global_rate)
+        workers = max(workers, 1)
+        self.global_bucket = TokenBucket(rate / workers, max(burst / workers, 1.0))
+        self.private = BucketRegistry(*parse_rate(private_rate), max_size=max_chats)
+        self.groups = BucketRegistry(*parse_rate(group_rate), max_size=max_chats)
+        self.retries = retries
+        self.waiting = 0
+        Gauge("shefport_bot_requests_waiting", "Bot API requests waiting for the rate limiter",
+              func=lambda: self.waiting)
+
+    async def __call__(self, make_request, bot, method):
+        if not method.__api_method__.startswith(LIMITED_PREFIXES):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        # Telegram считает каждое фото альбома отдельным сообщением
+        cost = len(method.media) if method.__api_method__ == "sendMediaGroup" else 1
+        attempt = 0
+        while True:
+            await self._acquire(chat_bucket, cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                bot_retry_after.inc(method.__api_method__)
+                if attempt > self.retries:
+                    raise
+                logger.warning(f"Telegram просит подождать {e.retry_after} с ({method.__api_method__}, чат {chat_id})")
+                # Флуд-контроль почти всегда относится к чату: остальные чаты не ждут
+                self._pause(chat_bucket or self.global_bucket, e.retry_after)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self.private.get(chat_id)
+        return self.groups.get(chat_id)
+
+    async def _acquire(self, chat_bucket: TokenBucket | None, cost: int = 1) -> None:
+        """Ждет, пока cost токенов есть и в общей корзине, и в корзине чата, и списывает оба.
+        Больше burst за раз не списывается, иначе большой альбом ждал бы вечно"""
+        buckets = [(bucket, min(cost, bucket.burst)) for bucket in (self.global_bucket, chat_bucket) if bucket]
+        delayed = False
+        self.waiting += 1
+        try:
+            while True:
+                wait = max(bucket.retry_after(tokens) for bucket, tokens in buckets)
+                if wait <= 0:
+                    for bucket, tokens in buckets:
+                        bucket.consume(tokens)
+                    return
+                if not delayed:
+                    delayed = True
+                    bot_requests_limited.inc()
+                await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+
+    @staticmethod
+    def _pause(bucket: TokenBucket, seconds: float) -> None:
+        bucket.tokens = 0
+        bucket.updated = max(bucket.updated, time.monotonic() + seconds)
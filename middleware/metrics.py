@@ -0,0 +1,41 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from services.metrics import Histogram, Counter, Gauge
+from utils.callback_data import callback_prefix
+
+HANDLER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+handler_seconds = Histogram("shefport_handler_seconds", "Handler wall time",
+                            ("router", "action"), HANDLER_BUCKETS)
+handler_errors = Counter("shefport_handler_errors_total", "Handler exceptions", ("router", "action"))
+updates_in_flight = Gauge("shefport_updates_in_flight", "Updates being handled right now")
+
+
+def event_action(event) -> str:
+    """Метка действия: префикс callback data или тип события"""
+    if isinstance(event, CallbackQuery):
+        return callback_prefix(event.data)
+    if isinstance(event, Message):
+        return "message"
+    return type(event).__name__
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Время работы хендлеров, ошибки и число апдейтов в обработке"""
+
+    async def __call__(self, handler, event, data):
+        router = data.get("event_router")
+        labels = (router.name if router else "unknown", event_action(event))
+        updates_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(*labels)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, *labels)
+            updates_in_flight.dec()
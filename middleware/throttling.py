@@ -0,0 +1,57 @@
+# middleware/throttling.py
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from data.config import THROTTLE_DEFAULT, THROTTLE_RULES, THROTTLE_GLOBAL, THROTTLE_USERS_MAX
+from middleware.metrics import event_action
+from services.metrics import Counter
+from utils.token_bucket import TokenBucket, BucketRegistry, parse_rate, parse_rules
+
+THROTTLE_REPLY = "Слишком быстро, подождите секунду"
+
+updates_throttled = Counter("shefport_updates_throttled_total", "Updates rejected by throttling",
+                            ("scope", "action"))
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Token bucket на пользователя (по префиксу callback) и общий на процесс.
+
+    Правила задаются как {префикс callback: (rate, burst)}, 'message' - для
+    сообщений, остальное по правилу по умолчанию. Корзины пользователей
+    хранятся в ограниченном LRU процесса: при нескольких webhook процессах
+    лимиты действуют в каждом процессе отдельно (без запросов к БД на апдейт).
+    Сообщения в активном состоянии FSM (ввод поиска, количества) не
+    ограничиваются, чтобы ввод пользователя не пропадал. Лишние сообщения
+    отбрасываются молча: ответ на каждое был бы еще одним запросом к Bot API
+    во время флуда; на callback отвечается всплывающей подсказкой.
+    """
+
+    def __init__(self, default: str = THROTTLE_DEFAULT, rules: str = THROTTLE_RULES,
+                 global_rate: str = THROTTLE_GLOBAL, max_users: int = THROTTLE_USERS_MAX):
+        self.default = parse_rate(default)
+        self.rules = parse_rules(rules)
+        self.global_bucket = TokenBucket(*parse_rate(global_rate))
+        self.registries = {action: BucketRegistry(*rate, max_size=max_users) for action, rate in self.rules.items()}
+        self.default_registry = BucketRegistry(*self.default, max_size=max_users)
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        if isinstance(event, Message) and data.get("raw_state") is not None:
+            return await handler(event, data)
+        action = event_action(event)
+        bucket = self.registries.get(action, self.default_registry).get((user.id, action))
+        if not bucket.consume():
+            return await self._reject(event, "user", action)
+        if not self.global_bucket.consume():
+            # Апдейт не обработан - токен пользователя возвращается
+            bucket.tokens = min(bucket.burst, bucket.tokens + 1)
+            return await self._reject(event, "global", action)
+        return await handler(event, data)
+
+    async def _reject(self, event, scope: str, action: str):
+        updates_throttled.inc(scope, action)
+        if isinstance(event, CallbackQuery):
+            await event.answer(THROTTLE_REPLY)
+        return None
@@ -0,0 +1,59 @@
+# middleware/update_context.py
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+from sqlalchemy.orm import Session
+
+from database.db import engine
+from database.instrumentation import start_update, finish_update
+from services.activity_writer import activity_writer
+
+
+def _activity(event):
+    """(chat_id, event_type, payload) для записи активности или None"""
+    # Сообщения
+    if isinstance(event, Message):
+        return event.chat.id, "message", event.text
+    # Нажатия кнопок
+    if isinstance(event, CallbackQuery):
+        chat_id = event.message.chat.id if event.message else event.from_user.id
+        return chat_id, "callback_query", event.data
+    return None
+
+
+def _needs_session(handler_object) -> bool:
+    """Принимает ли хендлер аргумент session"""
+    if handler_object is None:
+        return True
+    return handler_object.varkw or "session" in handler_object.params
+
+
+class UpdateContextMiddleware(BaseMiddleware):
+    """Одна регистрация на апдейт вместо DBSession + UserActivity.
+
+    - активность пишется в очередь activity_writer без обращения к БД;
+    - Session создается только для хендлеров с аргументом session, а
+      соединение из пула берется при первом запросе (ленивость Session);
+    - учет запросов апдейта для database.instrumentation.
+    """
+
+    async def __call__(self, handler, event, data):
+        activity = _activity(event)
+        if activity is not None:
+            # Запись как есть, в БД уходит пачками из фоновой задачи
+            activity_writer.record(*activity)
+
+        handler_object = data.get("handler")
+        token = start_update(handler_object.callback.__name__ if handler_object else "unknown")
+        session = Session(engine) if _needs_session(handler_object) else None
+        try:
+            if session is not None:
+                data["session"] = session
+            return await handler(event, data)
+        except Exception:
+            if session is not None:
+                session.rollback()
+            raise
+        finally:
+            if session is not None:
+                session.close()
+            finish_update(token)
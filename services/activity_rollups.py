@@ -0,0 +1,134 @@
+"""
+Module services.activity_rollups
+
+Pre-aggregated activity rollups.
+
+- activity_daily_rollup: events per day x event_type x action prefix;
+- activity_daily_chats: unique chats per day (with their event counts).
+
+The activity writer adds every flushed batch with upserts in the same
+transaction as the raw rows. A nightly job rebuilds the previous day from raw
+rows (one partition) to correct for dropped batches, and an empty rollup
+table is backfilled from all raw rows on startup. Reports read only rollups.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from loguru import logger
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from database.models import ActivityDailyRollup, ActivityDailyChat, CostumerActivity
+from utils.callback_data import callback_prefix
+
+
+def utc_today() -> date:
+    """Текущая дата в UTC, как activity_date в costumer_activity"""
+    return datetime.now(timezone.utc).date()
+
+
+def action_key(event_type: str, action: str | None) -> str:
+    """Префикс действия: callback без id, команда для сообщений, 'text' для прочего текста"""
+    if event_type == "callback_query":
+        return callback_prefix(action)
+    if action and action.startswith("/"):
+        return action.split()[0][:64]
+    return "text"
+
+
+def aggregate_rows(rows) -> tuple[Counter, Counter]:
+    """Считает (day, event_type, action) и (day, chat_id) по строкам активности"""
+    events = Counter()
+    chats = Counter()
+    for row in rows:
+        events[(row["activity_date"], row["event_type"], action_key(row["event_type"], row["action"]))] += 1
+        chats[(row["activity_date"], row["chat_id"])] += 1
+    return events, chats
+
+
+def apply_rollups(conn, rows) -> None:
+    """Добавляет пачку строк активности к дневным агрегатам (upsert с приращением)"""
+    events, chats = aggregate_rows(rows)
+    if events:
+        stmt = insert(ActivityDailyRollup).values([
+            {"day": day, "event_type": event_type, "action": action, "events": count}
+            for (day, event_type, action), count in events.items()
+        ])
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "event_type", "action"],
+            set_={"events": ActivityDailyRollup.events + stmt.excluded.events},
+        ))
+    if chats:
+        stmt = insert(ActivityDailyChat).values([
+            {"day": day, "chat_id": chat_id, "events": count}
+            for (day, chat_id), count in chats.items()
+        ])
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "chat_id"],
+            set_={"events": ActivityDailyChat.events + stmt.excluded.events},
+        ))
+
+
+def rebuild_activity_rollups(engine: Engine, since: date, until: date | None = None) -> None:
+    """Пересчитывает агрегаты за дни [since, until] из сырых строк costumer_activity"""
+    columns = (CostumerActivity.activity_date, CostumerActivity.event_type,
+               CostumerActivity.action, CostumerActivity.chat_id)
+    stmt = select(*columns).where(CostumerActivity.activity_date >= since)
+    if until is not None:
+        stmt = stmt.where(CostumerActivity.activity_date <= until)
+    with engine.begin() as conn:
+        for model in (ActivityDailyRollup, ActivityDailyChat):
+            cleanup = delete(model).where(model.day >= since)
+            if until is not None:
+                cleanup = cleanup.where(model.day <= until)
+            conn.execute(cleanup)
+        result = conn.execute(stmt.execution_options(yield_per=5000))
+        for partition in result.mappings().partitions():
+            apply_rollups(conn, partition)
+    logger.info(f"Агрегаты активности пересчитаны с {since}")
+
+
+def backfill_activity_rollups(engine: Engine) -> None:
+    """Заполняет пустые агрегаты по всей истории сырых событий"""
+    with Session(engine) as sess:
+        if sess.scalar(select(func.count()).select_from(ActivityDailyRollup)):
+            return
+        first_day = sess.scalar(select(func.min(CostumerActivity.activity_date)))
+    if first_day is not None:
+        rebuild_activity_rollups(engine, first_day)
+
+
+def rebuild_yesterday_rollups(engine: Engine) -> None:
+    yesterday = utc_today() - timedelta(days=1)
+    rebuild_activity_rollups(engine, yesterday, yesterday)
+
+
+def get_daily_activity(session: Session, days: int = 7):
+    """[(day, events, unique chats)] за последние days дней"""
+    since = utc_today() - timedelta(days=days - 1)
+    events = dict(session.execute(
+        select(ActivityDailyRollup.day, func.sum(ActivityDailyRollup.events))
+        .where(ActivityDailyRollup.day >= since).group_by(ActivityDailyRollup.day)
+    ).all())
+    chats = dict(session.execute(
+        select(ActivityDailyChat.day, func.count())
+        .where(ActivityDailyChat.day >= since).group_by(ActivityDailyChat.day)
+    ).all())
+    return [(since + timedelta(days=i), int(events.get(since + timedelta(days=i), 0)),
+             chats.get(since + timedelta(days=i), 0)) for i in range(days)]
+
+
+def get_top_actions(session: Session, days: int = 30, limit: int = 15):
+    """[(event_type, action, events)] самые частые действия за последние days дней"""
+    since = utc_today() - timedelta(days=days - 1)
+    total = func.sum(ActivityDailyRollup.events)
+    stmt = (
+        select(ActivityDailyRollup.event_type, ActivityDailyRollup.action, total)
+        .where(ActivityDailyRollup.day >= since)
+        .group_by(ActivityDailyRollup.event_type, ActivityDailyRollup.action)
+        .order_by(total.desc())
+        .limit(limit)
+    )
+    return session.execute(stmt).all()
@@ -0,0 +1,132 @@
+"""
+Module services.activity_writer
+
+Buffered writer for CostumerActivity events.
+
+UpdateContextMiddleware only puts a row into a bounded in-memory queue; a
+background task writes rows in bulk (one multi-row INSERT) every
+``batch_size`` events or ``flush_interval_ms`` milliseconds, whichever comes
+first. Daily rollups are updated in the same transaction. When the queue is full new events are dropped and counted instead of
+slowing down updates. ``stop`` flushes what is left on shutdown, including
+the batch the background task was collecting or writing.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from data.config import ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_MS, ACTIVITY_QUEUE_MAX
+from database.db import engine
+from database.models import CostumerActivity
+from services.activity_rollups import apply_rollups
+from services.metrics import Counter, Gauge
+from services.unique_users import unique_users
+
+activity_flushed = Counter("shefport_activity_rows_written_total", "Activity rows written to DB")
+activity_dropped = Counter("shefport_activity_rows_dropped_total", "Activity rows dropped (queue full or DB error)")
+
+
+class ActivityWriter:
+    """Bounded queue + periodic bulk INSERT into costumer_activity"""
+
+    def __init__(self, engine: Engine, batch_size: int, flush_interval_ms: int, max_queue: int):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: asyncio.Task | None = None
+        self._pending: list[dict] = []
+        self._flushing: asyncio.Future | None = None
+        Gauge("shefport_activity_queue_depth", "Activity rows waiting to be written", func=self._queue.qsize)
+
+    def record(self, chat_id: int, event_type: str, payload: str | None) -> None:
+        """Queues one event; never blocks"""
+        now = datetime.now(timezone.utc)
+        payload = payload[:255] if payload else payload
+        row = {
+            "chat_id": chat_id,
+            "event_type": event_type,
+            "action": payload,
+            "payload": payload,
+            "created_at": now,
+            "activity_date": now.date(),
+            "week": now.isocalendar().week,
+            "month": now.month,
+            "year": now.year,
+        }
+        unique_users.add(row["activity_date"], chat_id)
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            activity_dropped.inc()
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the background task and flushes the remaining rows"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Порция, которую _run уже писал в момент остановки, дописывается до конца
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        # Порция, которую _run собирал в момент остановки
+        rows, self._pending = self._pending, []
+        await self._flush(rows)
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+
+    def _drain(self, limit: int) -> list[dict]:
+        rows = []
+        while len(rows) < limit and not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        return rows
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Собираемая порция хранится в self._pending, чтобы stop мог ее записать
+            rows = self._pending
+            rows.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(rows) < self.batch_size:
+                rows.extend(self._drain(self.batch_size - len(rows)))
+                timeout = deadline - loop.time()
+                if len(rows) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            self._pending = []
+            # shield: отмена _run не прерывает уже начатую запись, stop ее дожидается
+            self._flushing = asyncio.ensure_future(self._flush(rows))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(self._insert, rows)
+            activity_flushed.inc(amount=len(rows))
+        except Exception as e:
+            activity_dropped.inc(amount=len(rows))
+            logger.exception(f"Ошибка записи {len(rows)} событий активности: {e}")
+
+    def _insert(self, rows: list[dict]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(insert(CostumerActivity.__table__), rows)
+            apply_rollups(conn, rows)
+
+
+activity_writer = ActivityWriter(engine, ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_MS, ACTIVITY_QUEUE_MAX)
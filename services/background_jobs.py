@@ -0,0 +1,123 @@
+"""
+Module services.background_jobs
+
+Periodic maintenance jobs of the bot process (AsyncIOScheduler).
+Blocking DB work runs in a worker thread so the event loop is not stalled.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from loguru import logger
+
+from data.config import (ACTIVITY_PARTITIONS_AHEAD, ACTIVITY_RETENTION_MONTHS, ACTIVITY_RETENTION_MODE,
+                         SEARCH_STATS_FLUSH_MIN, FSM_STORAGE, PREWARM_CHAT_ID, PREWARM_RATE, PREWARM_BATCH,
+                         PREWARM_INTERVAL_MIN)
+from database.db import engine
+from database.partitions import ensure_activity_partitions, apply_activity_retention
+from services.activity_rollups import backfill_activity_rollups, rebuild_yesterday_rollups
+from services.fsm_storage import cleanup_expired_fsm
+from services.image_prewarm import prewarm_images
+from services.search_stats import search_stats, store_search_stats
+from services.unique_users import unique_users, store_sketches, backfill_unique_users
+
+scheduler = AsyncIOScheduler()
+
+
+async def maintain_activity_partitions() -> None:
+    """Создает будущие партиции costumer_activity и применяет срок хранения"""
+    try:
+        await asyncio.to_thread(ensure_activity_partitions, engine, ACTIVITY_PARTITIONS_AHEAD)
+        await asyncio.to_thread(apply_activity_retention, engine, ACTIVITY_RETENTION_MONTHS, ACTIVITY_RETENTION_MODE)
+    except Exception as e:
+        logger.exception(f"Ошибка обслуживания партиций costumer_activity: {e}")
+
+
+async def rebuild_activity_rollups_job() -> None:
+    """Пересчитывает агрегаты активности за вчерашний день из сырых событий"""
+    try:
+        await asyncio.to_thread(rebuild_yesterday_rollups, engine)
+    except Exception as e:
+        logger.exception(f"Ошибка пересчета агрегатов активности: {e}")
+
+
+async def backfill_activity_rollups_job() -> None:
+    """Однократно заполняет агрегаты активности и HyperLogLog скетчи по истории, если они пусты"""
+    try:
+        await asyncio.to_thread(backfill_activity_rollups, engine)
+        await asyncio.to_thread(backfill_unique_users, engine)
+    except Exception as e:
+        logger.exception(f"Ошибка заполнения агрегатов активности: {e}")
+
+
+async def persist_unique_users() -> None:
+    """Сохраняет измененные за период HyperLogLog скетчи уникальных пользователей"""
+    dirty = unique_users.take_dirty()
+    try:
+        await asyncio.to_thread(store_sketches, engine, dirty)
+    except Exception as e:
+        unique_users.mark_dirty(dirty)
+        logger.exception(f"Ошибка сохранения скетчей уникальных пользователей: {e}")
+
+
+async def persist_search_stats() -> None:
+    """Записывает частые поисковые запросы за период в search_query_stats"""
+    taken = search_stats.take()
+    try:
+        await asyncio.to_thread(store_search_stats, engine, taken)
+    except Exception as e:
+        search_stats.restore(taken)
+        logger.exception(f"Ошибка сохранения статистики поиска: {e}")
+
+
+async def cleanup_fsm_storage() -> None:
+    """Удаляет просроченные записи FSM из fsm_storage"""
+    try:
+        removed = await asyncio.to_thread(cleanup_expired_fsm, engine)
+        if removed:
+            logger.info(f"Удалено {removed} просроченных записей FSM")
+    except Exception as e:
+        logger.exception(f"Ошибка очистки fsm_storage: {e}")
+
+
+async def prewarm_images_job(bot) -> None:
+    """Загружает картинки товаров без file_id в служебный чат"""
+    try:
+        uploaded = await prewarm_images(bot, PREWARM_CHAT_ID, PREWARM_RATE, PREWARM_BATCH)
+        if uploaded:
+            logger.info(f"Предзагружено {uploaded} картинок товаров")
+    except Exception as e:
+        logger.exception(f"Ошибка предзагрузки картинок товаров: {e}")
+
+
+def schedule_image_prewarm() -> None:
+    """Переносит ближайший запуск предзагрузки картинок на сейчас (после импорта каталога).
+    Задача есть только в основном процессе; в остальных импорт подхватит ее плановый запуск"""
+    job = scheduler.get_job("image_prewarm") if scheduler.running else None
+    if job is not None:
+        job.modify(next_run_time=datetime.now(timezone.utc))
+
+
+def start_background_jobs(bot, primary: bool = True) -> None:
+    """Registers background jobs and starts the scheduler.
+
+    Jobs that flush this process' in-memory state run in every process;
+    maintenance jobs over shared tables run only in the primary one.
+    """
+    scheduler.add_job(persist_unique_users, "interval", minutes=1, id="unique_users", replace_existing=True)
+    scheduler.add_job(persist_search_stats, "interval", minutes=SEARCH_STATS_FLUSH_MIN, id="search_stats",
+                      replace_existing=True)
+    if primary:
+        scheduler.add_job(maintain_activity_partitions, "cron", hour=3, minute=15, id="activity_partitions",
+                          replace_existing=True)
+        scheduler.add_job(rebuild_activity_rollups_job, "cron", hour=0, minute=20, timezone="UTC",
+                          id="activity_rollups", replace_existing=True)
+        scheduler.add_job(backfill_activity_rollups_job, id="activity_rollups_backfill", replace_existing=True)
+        if PREWARM_CHAT_ID:
+            scheduler.add_job(prewarm_images_job, "interval", minutes=PREWARM_INTERVAL_MIN, args=[bot],
+                              id="image_prewarm", replace_existing=True)
+        if FSM_STORAGE == "postgres":
+            scheduler.add_job(cleanup_fsm_storage, "interval", minutes=30, id="fsm_cleanup",
+                              replace_existing=True)
+    scheduler.start()
+    logger.info("Фоновые задачи запущены")
@@ -0,0 +1,50 @@
+"""
+Module services.card_cache
+
+Cache of rendered product cards (caption parts and keyboard rows).
+
+Entries are keyed by (product id, updated_at), so any write that touches a
+product produces a new key. In addition the cache is cleared whenever a new
+catalog snapshot is swapped in; that happens after every catalog write in
+this process (update_prooduct_field, update_products_from_df, load_data) and
+on invalidation messages from other processes.
+"""
+from collections import OrderedDict
+
+from data.config import CARD_CACHE_MAX
+from services.catalog_snapshot import on_snapshot_refresh
+from services.metrics import Counter, Gauge
+
+card_cache_hits = Counter("shefport_card_cache_hits_total", "Product cards rendered from cache")
+card_cache_misses = Counter("shefport_card_cache_misses_total", "Product cards rendered from scratch")
+
+
+class RenderCache:
+    """LRU {ключ: готовая карточка} не больше max_size записей"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict = OrderedDict()
+        Gauge("shefport_card_cache_size", "Rendered product cards in cache", func=lambda: len(self._items))
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            card_cache_misses.inc()
+            return None
+        self._items.move_to_end(key)
+        card_cache_hits.inc()
+        return item
+
+    def set(self, key, item) -> None:
+        self._items[key] = item
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+card_render_cache = RenderCache(CARD_CACHE_MAX)
+on_snapshot_refresh(card_render_cache.clear)
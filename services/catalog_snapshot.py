@@ -0,0 +1,206 @@
+"""
+Module services.catalog_snapshot
+
+Process-local read model of the catalog.
+
+Categories and products change only on import, mail report or admin edit, so
+read-only handlers serve them from an immutable in-memory snapshot instead of
+querying Postgres. The snapshot is rebuilt in a worker thread after catalog
+writes and swapped in with a single reference assignment; readers always see
+either the old or the new snapshot, never a partially built one.
+If no snapshot is available yet, the helpers fall back to the database.
+"""
+import asyncio
+from datetime import datetime
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.db import (
+    engine,
+    get_all_categories,
+    get_products_by_category,
+    get_product_by_id,
+    get_product_by_article,
+    search_products,
+)
+from database.models import Product, Category
+from services.invalidation import subscribe
+from services.search import normalize_text
+
+IN_STOCK_MIN = 0.05  # тот же порог, что и в get_products_by_category
+
+
+class ProductRecord:
+    """Compact read-only product record with the fields used by handlers"""
+    __slots__ = ("id", "name", "price", "unit", "article", "description", "image", "main_image",
+                 "ostatok", "category_id", "characteristics", "updated_at", "name_forms")
+
+    def __init__(self, product: Product):
+        self.id = product.id
+        self.name = product.name
+        self.price = product.price
+        self.unit = product.unit
+        self.article = product.article
+        self.description = product.description
+        self.image = product.image
+        self.main_image = product.main_image
+        self.ostatok = product.ostatok
+        self.category_id = product.category_id
+        self.characteristics = product.characteristics
+        self.updated_at = product.updated_at
+        self.name_forms = frozenset(normalize_text(product.name))
+
+    @property
+    def in_stock(self) -> bool:
+        return self.ostatok is not None and self.ostatok > IN_STOCK_MIN
+
+    def __repr__(self):
+        return f"<ProductRecord(id={self.id}, name='{self.name}', price={self.price})>"
+
+
+class CategoryRecord:
+    """Compact read-only category record"""
+    __slots__ = ("id", "name")
+
+    def __init__(self, category_id: int, name: str):
+        self.id = category_id
+        self.name = name
+
+
+class CatalogSnapshot:
+    """Immutable catalog indexes by product id, category and article"""
+    __slots__ = ("categories", "by_id", "by_category", "by_article", "built_at")
+
+    def __init__(self, categories: list[CategoryRecord], products: list[ProductRecord]):
+        self.categories = tuple(categories)
+        self.by_id = {p.id: p for p in products}
+        self.by_article = {p.article: p for p in products if p.article is not None}
+        by_category: dict[int, list[ProductRecord]] = {}
+        for product in products:
+            by_category.setdefault(product.category_id, []).append(product)
+        self.by_category = {k: tuple(v) for k, v in by_category.items()}
+        self.built_at = datetime.now()
+
+    def products_by_category(self, category_id: int, in_stock: bool = False) -> tuple:
+        products = self.by_category.get(category_id, ())
+        if in_stock:
+            return tuple(p for p in products if p.in_stock)
+        return products
+
+    def search(self, query: str) -> list[ProductRecord]:
+        """Search by lemmatized name, products in stock first (as search_products)"""
+        query_forms = normalize_text(query)
+        found = [p for p in self.by_id.values() if query_forms & p.name_forms]
+        found.sort(key=lambda p: not p.in_stock)
+        return found
+
+
+_snapshot: CatalogSnapshot | None = None
+_refresh_task: asyncio.Task | None = None
+_refresh_again = False
+_refresh_callbacks: list[Callable[[], None]] = []
+
+
+def build_snapshot() -> CatalogSnapshot:
+    """Loads the whole catalog with a dedicated session (runs in a worker thread)"""
+    with Session(engine) as sess:
+        categories = [CategoryRecord(c_id, name) for name, c_id in
+                      sess.execute(select(Category.name, Category.id).order_by(Category.id)).all()]
+        products = [ProductRecord(p) for p in sess.scalars(select(Product).order_by(Product.id))]
+    return CatalogSnapshot(categories, products)
+
+
+def get_catalog_snapshot() -> CatalogSnapshot | None:
+    """Returns the current snapshot or None if it has not been built yet"""
+    return _snapshot
+
+
+async def refresh_catalog_snapshot() -> None:
+    """Rebuilds the snapshot off the event loop and swaps it in atomically"""
+    global _snapshot
+    try:
+        snapshot = await asyncio.to_thread(build_snapshot)
+    except Exception as e:
+        logger.exception(f"Ошибка построения снимка каталога: {e}")
+        return
+    _snapshot = snapshot
+    for callback in _refresh_callbacks:
+        callback()
+    logger.info(f"Снимок каталога обновлен: {len(snapshot.by_id)} товаров, "
+                f"{len(snapshot.categories)} категорий")
+
+
+def on_snapshot_refresh(callback: Callable[[], None]) -> None:
+    """Registers callback() called after a new snapshot is swapped in (derived caches)"""
+    _refresh_callbacks.append(callback)
+
+
+async def _refresh_loop() -> None:
+    global _refresh_again
+    while True:
+        _refresh_again = False
+        await refresh_catalog_snapshot()
+        if not _refresh_again:
+            break
+
+
+def schedule_catalog_refresh() -> None:
+    """Requests a rebuild after a catalog write.
+
+    Requests that arrive while a rebuild is running are coalesced into one more rebuild.
+    """
+    global _refresh_task, _refresh_again
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("Нет запущенного event loop, снимок каталога не обновлен")
+        return
+    if _refresh_task and not _refresh_task.done():
+        _refresh_again = True
+        return
+    _refresh_task = loop.create_task(_refresh_loop())
+
+
+# Изменения каталога в других процессах (импорт, админка другого инстанса)
+subscribe("product", lambda _: schedule_catalog_refresh())
+subscribe("category", lambda _: schedule_catalog_refresh())
+
+
+# Чтение каталога: снимок, а при его отсутствии - БД
+
+def catalog_categories(session: Session):
+    """Categories ordered by id"""
+    if _snapshot is not None:
+        return _snapshot.categories
+    return get_all_categories(session)
+
+
+def catalog_products_by_category(session: Session, category_id: int, in_stock: bool = False):
+    """Products of a category, optionally only in stock"""
+    if _snapshot is not None:
+        return _snapshot.products_by_category(category_id, in_stock)
+    return get_products_by_category(session, category_id, in_stock)
+
+
+def catalog_product(session: Session, product_id: int):
+    """Product by id"""
+    if _snapshot is not None and product_id in _snapshot.by_id:
+        return _snapshot.by_id[product_id]
+    return get_product_by_id(session, product_id)
+
+
+def catalog_product_by_article(session: Session, article: str):
+    """Product by article"""
+    if _snapshot is not None and article in _snapshot.by_article:
+        return _snapshot.by_article[article]
+    return get_product_by_article(session, article)
+
+
+def catalog_search(session: Session, query: str):
+    """Search products by name"""
+    if _snapshot is not None:
+        return _snapshot.search(query)
+    return search_products(session, query)
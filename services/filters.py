@@ -1,9 +1,33 @@
+import time
+
 from aiogram.filters import BaseFilter
 from aiogram.types import Message
 
 from database.db import is_admin, session
+from services.invalidation import subscribe
+
+ADMIN_CACHE_TTL = 3600  # сек, свежесть поддерживается инвалидацией через NOTIFY
+
+_admin_cache: dict[int, tuple[bool, float]] = {}
+
+
+def evict_admin(tg_id: int | None = None) -> None:
+    """Сбрасывает кэш прав админа для пользователя (или весь кэш при None)"""
+    if tg_id is None:
+        _admin_cache.clear()
+    else:
+        _admin_cache.pop(tg_id, None)
+
+
+subscribe("admin", evict_admin)
 
 
 class IsAdmin(BaseFilter):
     async def __call__(self, message: Message):
-        return is_admin(session, message.from_user.id)
+        user_id = message.from_user.id
+        cached = _admin_cache.get(user_id)
+        if cached and time.monotonic() - cached[1] < ADMIN_CACHE_TTL:
+            return cached[0]
+        result = bool(is_admin(session, user_id))
+        _admin_cache[user_id] = (result, time.monotonic())
+        return result
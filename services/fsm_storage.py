@@ -0,0 +1,121 @@
+"""
+Module services.fsm_storage
+
+aiogram FSM storage in the Postgres table fsm_storage.
+
+State and data of a key live in one row (data as JSONB), so several polling
+or webhook processes share FSM state and it survives restarts. Every write
+moves ``expires_at`` forward by ``ttl`` seconds; expired rows are invisible
+to reads and are removed in batches by ``cleanup_expired_fsm`` from a
+background job. Blocking DB calls run in a worker thread.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DefaultKeyBuilder, KeyBuilder
+from sqlalchemy import select, delete, or_, and_, case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from database.models import FsmRecord
+
+CLEANUP_BATCH = 1000
+
+
+def _state_name(state: StateType) -> str | None:
+    return state.state if isinstance(state, State) else state
+
+
+class PostgresStorage(BaseStorage):
+    """FSM storage aiogram в таблице fsm_storage"""
+
+    def __init__(self, engine: Engine, ttl: int | None = None, key_builder: KeyBuilder | None = None):
+        self.engine = engine
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+
+    def _expires_at(self):
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl) if self.ttl else None
+
+    def _alive(self):
+        return or_(FsmRecord.expires_at.is_(None), FsmRecord.expires_at > datetime.now(timezone.utc))
+
+    def _upsert(self, key: str, **values) -> None:
+        """Записывает state или data; поля просроченной записи сбрасываются"""
+        now = datetime.now(timezone.utc)
+        expired = and_(FsmRecord.expires_at.is_not(None), FsmRecord.expires_at <= now)
+        stmt = insert(FsmRecord).values(key=key, **{"state": None, "data": {}, **values},
+                                        expires_at=self._expires_at())
+        set_ = {"expires_at": stmt.excluded.expires_at}
+        for column in ("state", "data"):
+            if column in values:
+                set_[column] = getattr(stmt.excluded, column)
+            else:
+                set_[column] = case((expired, getattr(stmt.excluded, column)), else_=getattr(FsmRecord, column))
+        with Session(self.engine) as sess, sess.begin():
+            sess.execute(stmt.on_conflict_do_update(index_elements=["key"], set_=set_))
+
+    def _get(self, key: str, column):
+        with Session(self.engine) as sess:
+            return sess.scalar(select(column).where(FsmRecord.key == key, self._alive()))
+
+    def _merge_data(self, key: str, patch: dict) -> dict:
+        """Атомарно дополняет data (data || patch) и возвращает результат"""
+        now = datetime.now(timezone.utc)
+        expired = and_(FsmRecord.expires_at.is_not(None), FsmRecord.expires_at <= now)
+        stmt = insert(FsmRecord).values(key=key, state=None, data=patch, expires_at=self._expires_at())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                "state": case((expired, None), else_=FsmRecord.state),
+                "data": case((expired, stmt.excluded.data), else_=FsmRecord.data.op("||")(stmt.excluded.data)),
+                "expires_at": stmt.excluded.expires_at,
+            },
+        ).returning(FsmRecord.data)
+        with Session(self.engine) as sess, sess.begin():
+            return sess.execute(stmt).scalar_one()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await asyncio.to_thread(self._upsert, self.key_builder.build(key), state=_state_name(state))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return await asyncio.to_thread(self._get, self.key_builder.build(key), FsmRecord.state)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        await asyncio.to_thread(self._upsert, self.key_builder.build(key), data=dict(data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        data = await asyncio.to_thread(self._get, self.key_builder.build(key), FsmRecord.data)
+        return dict(data) if data else {}
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        return await asyncio.to_thread(self._merge_data, self.key_builder.build(key), dict(data))
+
+    async def close(self) -> None:
+        pass
+
+
+def _delete_expired_batch(engine: Engine, batch: int) -> int:
+    """Удаляет до batch просроченных записей в одной транзакции"""
+    with Session(engine) as sess, sess.begin():
+        expired = (select(FsmRecord.key)
+                   .where(FsmRecord.expires_at < datetime.now(timezone.utc))
+                   .limit(batch)
+                   .with_for_update(skip_locked=True)
+                   .scalar_subquery())
+        return sess.execute(delete(FsmRecord).where(FsmRecord.key.in_(expired))).rowcount
+
+
+def cleanup_expired_fsm(engine: Engine, batch: int = CLEANUP_BATCH) -> int:
+    """Удаляет просроченные записи пачками по batch строк, возвращает число удаленных"""
+    removed = 0
+    while True:
+        count = _delete_expired_batch(engine, batch)
+        removed += count
+        if count < batch:
+            return removed
@@ -0,0 +1,71 @@
+"""
+Module services.hll
+
+HyperLogLog sketch for approximate distinct counts.
+
+A sketch is ``2 ** precision`` one-byte registers (16 KB at the default
+precision 14, standard error ~0.8%). Sketches of the same precision merge by
+taking the register-wise maximum, so daily sketches can be combined into any
+week or month range, and merging the same data twice does not change the
+result.
+"""
+import hashlib
+import math
+
+DEFAULT_PRECISION = 14
+
+
+def _hash64(value) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog с линейным подсчетом для малых множеств"""
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: bytes | None = None):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"Недопустимая точность HyperLogLog: {precision}")
+        self.precision = precision
+        size = 1 << precision
+        if registers is not None and len(registers) != size:
+            raise ValueError("Размер регистров не соответствует точности")
+        self.registers = bytearray(registers) if registers is not None else bytearray(size)
+
+    def add(self, value) -> None:
+        x = _hash64(value)
+        bits = 64 - self.precision
+        index = x >> bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Объединяет other в текущий скетч (максимум по регистрам)"""
+        if other.precision != self.precision:
+            raise ValueError("Нельзя объединить скетчи разной точности")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(data[0], data[1:])
+
+    @classmethod
+    def union(cls, sketches, precision: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        result = cls(precision)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
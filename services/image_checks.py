@@ -0,0 +1,154 @@
+"""
+Module services.image_checks
+
+Non-blocking validation of product image links.
+
+``ImageChecker.is_ok(url)`` answers from an in-memory cache, then from the
+image_checks table, and only if both are missing or older than
+``IMAGE_CHECK_TTL`` sends a HEAD request through one shared aiohttp session
+with a short timeout. Concurrent checks of the same link share one request.
+A definite HTTP answer is persisted, so a link is checked at most once per
+TTL across restarts and processes; network errors are cached in memory for
+a few minutes only.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import aiohttp
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+
+from data.config import IMAGE_CHECK_TIMEOUT, IMAGE_CHECK_TTL, IMAGE_CHECK_CACHE_MAX
+from database.db import engine
+from database.models import ImageCheck
+from services.metrics import Counter
+
+# Сколько помнить сетевую ошибку (таймаут, DNS) до повторной проверки, с
+ERROR_TTL = 300
+
+# Ответы Telegram о самой картинке: ссылка не скачалась, это не фото, фото слишком большое.
+# Ошибки чата и прав (chat not found, not enough rights) к картинке отношения не имеют
+IMAGE_ERRORS = ("wrong file identifier/http url", "failed to get http url content",
+                "wrong type of the web page content", "webpage_curl_failed", "webpage_media_empty",
+                "image_process_failed", "photo_invalid_dimensions", "photo_save_file_invalid", "too big")
+
+image_checks_total = Counter("shefport_image_checks_total", "HTTP checks of product image links")
+image_checks_broken = Counter("shefport_image_checks_broken_total", "Product image links found broken")
+
+
+def load_check(engine: Engine, url: str) -> tuple[bool, datetime] | None:
+    with engine.connect() as conn:
+        row = conn.execute(select(ImageCheck.ok, ImageCheck.checked_at).where(ImageCheck.url == url)).first()
+    return (row.ok, row.checked_at) if row else None
+
+
+def store_check(engine: Engine, url: str, ok: bool, status: int | None, checked_at: datetime) -> None:
+    stmt = insert(ImageCheck).values(url=url, ok=ok, status=status, checked_at=checked_at)
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["url"],
+            set_={"ok": stmt.excluded.ok, "status": stmt.excluded.status, "checked_at": stmt.excluded.checked_at},
+        ))
+
+
+def is_image_error(error: Exception) -> bool:
+    """True, если Telegram отклонил запрос из-за картинки, а не из-за чата или сообщения"""
+    text = str(error).lower()
+    return any(marker in text for marker in IMAGE_ERRORS)
+
+
+class ImageChecker:
+    """LRU кэш {url: (ok, годен до по time.monotonic)} не больше max_size ссылок + общая aiohttp сессия"""
+
+    def __init__(self, engine: Engine, ttl: int, timeout: float, max_size: int = IMAGE_CHECK_CACHE_MAX):
+        self.engine = engine
+        self.ttl = ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_size = max_size
+        self._cache: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+        self._http: aiohttp.ClientSession | None = None
+
+    async def is_ok(self, url: str) -> bool:
+        cached = self._cache.get(url)
+        if cached:
+            if cached[1] > time.monotonic():
+                self._cache.move_to_end(url)
+                return cached[0]
+            del self._cache[url]
+        pending = self._pending.get(url)
+        if pending is None:
+            pending = asyncio.ensure_future(self._check(url))
+            self._pending[url] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(url, None))
+        return await asyncio.shield(pending)
+
+    async def _check(self, url: str) -> bool:
+        try:
+            stored = await asyncio.to_thread(load_check, self.engine, url)
+        except Exception as e:
+            logger.exception(f"Ошибка чтения image_checks для {url}: {e}")
+            stored = None
+        if stored:
+            ok, checked_at = stored
+            age = (datetime.now(timezone.utc) - checked_at).total_seconds()
+            if age < self.ttl:
+                self._remember(url, ok, self.ttl - age)
+                return ok
+
+        try:
+            status = await self._request(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Картинка {url} недоступна: {e!r}")
+            image_checks_broken.inc()
+            self._remember(url, False, ERROR_TTL)
+            return False
+
+        ok = status == 200
+        if not ok:
+            image_checks_broken.inc()
+            logger.warning(f"Картинка {url} ответила {status}")
+        self._remember(url, ok, self.ttl)
+        try:
+            await asyncio.to_thread(store_check, self.engine, url, ok, status, datetime.now(timezone.utc))
+        except Exception as e:
+            logger.exception(f"Ошибка записи image_checks для {url}: {e}")
+        return ok
+
+    async def _request(self, url: str) -> int:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(timeout=self.timeout)
+        image_checks_total.inc()
+        async with self._http.head(url, allow_redirects=True) as response:
+            if response.status != 405:
+                return response.status
+        # Сервер не поддерживает HEAD - достаточно заголовков ответа на GET
+        async with self._http.get(url, allow_redirects=True) as response:
+            return response.status
+
+    async def mark_broken(self, url: str) -> None:
+        """Запоминает ссылку как битую без HTTP проверки (например, ее не принял Telegram)"""
+        image_checks_broken.inc()
+        self._remember(url, False, self.ttl)
+        try:
+            await asyncio.to_thread(store_check, self.engine, url, False, None, datetime.now(timezone.utc))
+        except Exception as e:
+            logger.exception(f"Ошибка записи image_checks для {url}: {e}")
+
+    def _remember(self, url: str, ok: bool, ttl: float) -> None:
+        self._cache[url] = (ok, time.monotonic() + ttl)
+        self._cache.move_to_end(url)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+
+image_checker = ImageChecker(engine, IMAGE_CHECK_TTL, IMAGE_CHECK_TIMEOUT)
@@ -0,0 +1,97 @@
+"""
+Module services.image_prewarm
+
+Pre-warming of the product image file_id cache (services.product_images).
+
+Products whose image link has no file_id yet are uploaded once to a private
+service chat (``PREWARM_CHAT_ID``) at ``PREWARM_RATE`` photos per second; the
+file_id from the response is stored and the service message is deleted.
+Products in stock go first, then categories most often put into carts and
+orders. A run uploads at most ``PREWARM_BATCH`` images, so a fresh import is
+warmed by a few consecutive runs. Links Telegram refuses to download are
+recorded as broken in image_checks and skipped until ``IMAGE_CHECK_TTL``
+expires.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from loguru import logger
+from sqlalchemy import select, func, union_all, and_, exists
+from sqlalchemy.engine import Engine
+
+from data.config import IMAGE_CHECK_TTL
+from database.db import engine
+from database.models import Product, ProductImage, CartItems, OrderItems, ImageCheck
+from services.catalog_snapshot import IN_STOCK_MIN
+from services.image_checks import image_checker, is_image_error
+from services.metrics import Counter
+from services.product_images import product_images
+
+prewarm_uploaded = Counter("shefport_image_prewarm_uploaded_total", "Product images uploaded by the pre-warm job")
+
+
+def products_to_prewarm(engine: Engine, limit: int) -> list[tuple[int, str]]:
+    """(id, main_image) товаров со ссылкой на картинку без file_id в порядке приоритета"""
+    # Недавно проверенные битые ссылки не занимают место в порции
+    broken = exists().where(
+        ImageCheck.url == Product.main_image,
+        ImageCheck.ok.is_(False),
+        ImageCheck.checked_at > datetime.now(timezone.utc) - timedelta(seconds=IMAGE_CHECK_TTL),
+    )
+    picked = union_all(select(CartItems.product_id), select(OrderItems.product_id)).subquery()
+    popularity = (
+        select(Product.category_id, func.count().label("picks"))
+        .join(picked, picked.c.product_id == Product.id)
+        .group_by(Product.category_id)
+        .subquery()
+    )
+    stmt = (
+        select(Product.id, Product.main_image)
+        .outerjoin(ProductImage, and_(ProductImage.product_id == Product.id,
+                                      ProductImage.source_url == Product.main_image))
+        .outerjoin(popularity, popularity.c.category_id == Product.category_id)
+        .where(Product.main_image.like("http%"), ProductImage.product_id.is_(None), ~broken)
+        .order_by(func.coalesce(Product.ostatok, 0) <= IN_STOCK_MIN,
+                  func.coalesce(popularity.c.picks, 0).desc(),
+                  Product.id)
+        .limit(limit)
+    )
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(stmt)]
+
+
+async def upload_image(bot: Bot, chat_id: int, url: str) -> str | None:
+    """Отправляет картинку в служебный чат и возвращает ее file_id.
+    Ошибки чата (не найден, нет прав) пробрасываются и останавливают запуск"""
+    try:
+        sent = await bot.send_photo(chat_id=chat_id, photo=url, disable_notification=True)
+    except TelegramBadRequest as e:
+        if not is_image_error(e):
+            raise
+        logger.warning(f"Telegram не принял картинку {url}: {e}")
+        # Иначе ссылка снова попадет в следующую порцию
+        await image_checker.mark_broken(url)
+        return None
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=sent.message_id)
+    except TelegramBadRequest:
+        pass
+    return sent.photo[-1].file_id if sent.photo else None
+
+
+async def prewarm_images(bot: Bot, chat_id: int, rate: float, batch: int) -> int:
+    """Загружает до batch картинок без file_id; возвращает число загруженных"""
+    candidates = await asyncio.to_thread(products_to_prewarm, engine, batch)
+    uploaded = 0
+    for product_id, url in candidates:
+        if not await image_checker.is_ok(url):
+            continue
+        file_id = await upload_image(bot, chat_id, url)
+        if file_id:
+            await product_images.remember(product_id, url, file_id)
+            prewarm_uploaded.inc()
+            uploaded += 1
+        await asyncio.sleep(1 / rate)
+    return uploaded
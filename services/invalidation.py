@@ -0,0 +1,126 @@
+"""
+Module services.invalidation
+
+Cross-instance cache invalidation bus on Postgres LISTEN/NOTIFY.
+
+Writers call ``notify_invalidation`` inside their transaction; Postgres
+delivers the message to every listening process only after COMMIT, so a
+rolled back write never evicts anything. Each process runs one
+``InvalidationListener`` that dispatches messages to the callbacks registered
+with ``subscribe``. Messages sent by the current process are skipped: local
+caches are already refreshed by the writer itself.
+"""
+import asyncio
+import json
+import os
+import socket
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+CHANNEL = "shefport_invalidate"
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+RECONNECT_DELAY = 5  # сек
+
+_subscribers: dict[str, list[Callable]] = {}
+
+
+def notify_invalidation(conn, entity: str, entity_id=None) -> None:
+    """Queues an invalidation message in the current transaction.
+
+    :param conn: Session or Connection of the writing transaction
+    :param entity: Entity type: "product", "category", "admin"
+    :param entity_id: ID of the changed entity or None for "all"
+    """
+    payload = json.dumps({"entity": entity, "id": entity_id, "origin": INSTANCE_ID})
+    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+def subscribe(entity: str, callback: Callable) -> None:
+    """Registers callback(entity_id) for messages about entity (sync or async)"""
+    _subscribers.setdefault(entity, []).append(callback)
+
+
+def dispatch(entity: str, entity_id=None) -> None:
+    """Calls subscribers of entity; coroutines are scheduled on the running loop"""
+    for callback in _subscribers.get(entity, []):
+        try:
+            result = callback(entity_id)
+            if asyncio.iscoroutine(result):
+                asyncio.get_running_loop().create_task(result)
+        except Exception as e:
+            logger.exception(f"Ошибка обработки инвалидации {entity}:{entity_id}: {e}")
+
+
+class InvalidationListener:
+    """Async LISTEN loop on a dedicated connection detached from the pool"""
+
+    def __init__(self, engine: Engine, channel: str = CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._conn = None
+        self._stopped = False
+
+    async def start(self) -> None:
+        self._stopped = False
+        try:
+            await asyncio.to_thread(self._connect)
+        except Exception as e:
+            logger.exception(f"Не удалось подписаться на канал {self.channel}: {e}")
+            self._schedule_reconnect()
+            return
+        asyncio.get_running_loop().add_reader(self._conn.fileno(), self._on_readable)
+        logger.info(f"Слушаем канал инвалидации {self.channel}")
+
+    async def stop(self) -> None:
+        self._stopped = True
+        self._close()
+
+    def _connect(self) -> None:
+        raw = self.engine.raw_connection()
+        raw.detach()  # соединение живет вне пула все время работы процесса
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        self._conn = conn
+
+    def _close(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _schedule_reconnect(self) -> None:
+        if self._stopped:
+            return
+        loop = asyncio.get_running_loop()
+        loop.call_later(RECONNECT_DELAY, lambda: loop.create_task(self.start()))
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except Exception as e:
+            logger.error(f"Соединение канала инвалидации потеряно: {e}")
+            self._close()
+            self._schedule_reconnect()
+            return
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                message = json.loads(notify.payload)
+            except ValueError:
+                logger.warning(f"Некорректное сообщение инвалидации: {notify.payload}")
+                continue
+            if message.get("origin") == INSTANCE_ID:
+                continue
+            dispatch(message.get("entity"), message.get("id"))
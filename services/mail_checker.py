@@ -8,6 +8,7 @@ from loguru import logger
 from data.config import MAIL_USER, MAIL_PASS, SENDER_FILTER, READ_DIR, MAIL_HOST
 from database.db import session
 from handlers.admin import send_file_to_admin
+from services.catalog_snapshot import schedule_catalog_refresh
 from services.updater_db import load_report, update_products_from_df
 
 # Конфигурация
@@ -84,6 +85,7 @@ async def check_mail_and_download(bot=None):
     #Обработка файла, загрузка в БД, выборка отсутствующих товаров и отправка админу
     df = load_report()
     count = update_products_from_df(df=df, session=session)
+    schedule_catalog_refresh()
     try:
         if bot and count > 0:  # Only try to send file if bot instance is provided
             await send_file_to_admin("data/output.xlsx", bot)
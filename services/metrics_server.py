@@ -0,0 +1,27 @@
+"""
+Module services.metrics_server
+
+Local HTTP endpoint serving services.metrics in Prometheus text format.
+"""
+from aiohttp import web
+from loguru import logger
+
+from services.metrics import render_prometheus
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner | None:
+    """Starts GET /metrics on host:port; port 0 disables the endpoint"""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,88 @@
+"""
+Module services.product_images
+
+Cache of Telegram file_id for product images.
+
+The first ``answer_photo`` with an image URL makes Telegram download the
+picture from the shop site; the file_id from the response is stored per
+product in product_images together with the URL it was made from, and later
+cards are sent by file_id. An entry is valid only while the product's
+main_image equals its source_url, so a changed picture is fetched again.
+"""
+import asyncio
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+
+from database.db import engine
+from database.models import ProductImage
+from services.metrics import Counter
+
+file_id_hits = Counter("shefport_image_file_id_hits_total", "Product cards sent by cached file_id")
+file_id_misses = Counter("shefport_image_file_id_misses_total", "Product cards sent by image URL")
+
+
+def load_file_id(engine: Engine, product_id: int) -> tuple[str, str] | None:
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(ProductImage.source_url, ProductImage.file_id).where(ProductImage.product_id == product_id)
+        ).first()
+    return (row.source_url, row.file_id) if row else None
+
+
+def store_file_id(engine: Engine, product_id: int, source_url: str, file_id: str) -> None:
+    stmt = insert(ProductImage).values(product_id=product_id, source_url=source_url, file_id=file_id)
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["product_id"],
+            set_={"source_url": stmt.excluded.source_url, "file_id": stmt.excluded.file_id,
+                  "updated_at": stmt.excluded.updated_at},
+        ))
+
+
+class ProductImageCache:
+    """{product_id: (source_url, file_id)} в памяти поверх таблицы product_images"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._by_product: dict[int, tuple[str, str]] = {}
+        # Картинки без товара (плейсхолдер) - только в памяти процесса
+        self._by_url: dict[str, str] = {}
+
+    async def get(self, product_id: int, source_url: str) -> str | None:
+        """file_id картинки source_url товара или None, если ее еще не отправляли"""
+        cached = self._by_product.get(product_id)
+        if cached is None:
+            try:
+                cached = await asyncio.to_thread(load_file_id, self.engine, product_id)
+            except Exception as e:
+                logger.exception(f"Ошибка чтения product_images для товара {product_id}: {e}")
+                cached = None
+            if cached is not None:
+                self._by_product[product_id] = cached
+        if cached is not None and cached[0] == source_url:
+            file_id_hits.inc()
+            return cached[1]
+        file_id_misses.inc()
+        return None
+
+    async def remember(self, product_id: int, source_url: str, file_id: str) -> None:
+        self._by_product[product_id] = (source_url, file_id)
+        try:
+            await asyncio.to_thread(store_file_id, self.engine, product_id, source_url, file_id)
+        except Exception as e:
+            logger.exception(f"Ошибка записи file_id товара {product_id}: {e}")
+
+    def forget(self, product_id: int) -> None:
+        self._by_product.pop(product_id, None)
+
+    def get_by_url(self, url: str) -> str | None:
+        return self._by_url.get(url)
+
+    def remember_url(self, url: str, file_id: str) -> None:
+        self._by_url[url] = file_id
+
+
+product_images = ProductImageCache(engine)
@@ -0,0 +1,82 @@
+"""
+Module services.quantity_coalescer
+
+Coalescing of quantity +/- taps on cart and order items.
+
+Each tap is answered by the handler right away and only adds its delta to a
+pending change of the item. The first tap of a series starts a timer; when
+the window (QUANTITY_COALESCE_MS) passes, the summed delta is written with
+one UPDATE (change_item_quantity) and the item card is edited once.
+"""
+import asyncio
+from typing import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from data.config import QUANTITY_COALESCE_MS
+from database.db import engine, change_item_quantity
+from services.metrics import Counter
+
+quantity_taps = Counter("shefport_quantity_taps_total", "Quantity +/- taps", ("model",))
+quantity_writes = Counter("shefport_quantity_writes_total", "Coalesced quantity UPDATEs", ("model",))
+
+OnApplied = Callable[[object], Awaitable[None]]
+
+
+class PendingChange:
+    __slots__ = ("model", "delta", "on_applied", "task")
+
+    def __init__(self, model, on_applied: OnApplied):
+        self.model = model
+        self.delta = 0
+        self.on_applied = on_applied
+        self.task: asyncio.Task | None = None
+
+
+class QuantityCoalescer:
+    def __init__(self, window_ms: int = QUANTITY_COALESCE_MS):
+        self.window = window_ms / 1000
+        self._pending: dict[tuple[str, int], PendingChange] = {}
+
+    def add(self, model, item_id: int, delta: int, on_applied: OnApplied) -> None:
+        """Добавляет delta к ожидающему изменению позиции.
+        on_applied(row) вызывается после записи со строкой (product_id, quantity, unit_price) или None"""
+        key = (model.__name__, item_id)
+        quantity_taps.inc(key[0])
+        change = self._pending.get(key)
+        if change is None:
+            change = self._pending[key] = PendingChange(model, on_applied)
+            change.task = asyncio.create_task(self._flush_later(key))
+        change.delta += delta
+        change.on_applied = on_applied
+
+    async def _flush_later(self, key) -> None:
+        await asyncio.sleep(self.window)
+        await self._flush(key)
+
+    async def _flush(self, key) -> None:
+        change = self._pending.pop(key, None)
+        if change is None or change.delta == 0:
+            return
+        try:
+            row = await asyncio.to_thread(self._apply, change.model, key[1], change.delta)
+            quantity_writes.inc(key[0])
+            await change.on_applied(row)
+        except Exception as e:
+            logger.exception(f"Ошибка изменения количества {key[0]} №{key[1]} на {change.delta}: {e}")
+
+    @staticmethod
+    def _apply(model, item_id: int, delta: int):
+        with Session(engine) as sess:
+            return change_item_quantity(sess, item_id, delta, model)
+
+    async def flush_all(self) -> None:
+        """Немедленно записывает все ожидающие изменения (при остановке)"""
+        for key, change in list(self._pending.items()):
+            if change.task is not None:
+                change.task.cancel()
+            await self._flush(key)
+
+
+quantity_coalescer = QuantityCoalescer()
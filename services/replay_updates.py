@@ -0,0 +1,105 @@
+"""
+Module services.replay_updates
+
+Recording and replaying of Telegram updates for local testing of webhook mode.
+
+    python -m services.replay_updates record updates.jsonl --limit 100
+    python -m services.replay_updates replay updates.jsonl --url http://127.0.0.1:8080/webhook --concurrency 20
+
+``record`` pulls pending updates with getUpdates (the bot must not be running
+and no webhook may be set) and writes one JSON update per line. ``replay``
+POSTs every line to the webhook with the secret token header and reports
+throughput and status codes. Use ``--chat-id`` to redirect all updates to a
+test chat.
+
+A 200 answer only means the update was accepted: the webhook handler answers
+before the update is processed, and handler errors are only logged. Check
+the bot log or the handler metrics to see that updates were really handled.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import aiohttp
+
+from data.config import BOT_TOKEN, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH
+
+
+async def record(path: str, limit: int) -> None:
+    api = f"https://api.telegram.org/bot{BOT_TOKEN}/getUpdates"
+    offset = None
+    written = 0
+    async with aiohttp.ClientSession() as http:
+        with open(path, "a", encoding="utf-8") as file:
+            while written < limit:
+                params = {"timeout": 30, "limit": min(100, limit - written)}
+                if offset is not None:
+                    params["offset"] = offset
+                async with http.get(api, params=params) as response:
+                    updates = (await response.json()).get("result", [])
+                if not updates:
+                    break
+                for update in updates:
+                    file.write(json.dumps(update, ensure_ascii=False) + "\n")
+                    offset = update["update_id"] + 1
+                    written += 1
+    print(f"Записано апдейтов: {written}")
+
+
+def _redirect(update: dict, chat_id: int) -> dict:
+    """Подменяет чат и пользователя во всех вложенных объектах"""
+    for key, value in update.items():
+        if isinstance(value, dict):
+            if key == "chat" or key == "from":
+                value["id"] = chat_id
+            else:
+                _redirect(value, chat_id)
+    return update
+
+
+async def replay(path: str, url: str, concurrency: int, chat_id: int | None) -> None:
+    with open(path, encoding="utf-8") as file:
+        updates = [json.loads(line) for line in file if line.strip()]
+    if chat_id is not None:
+        updates = [_redirect(update, chat_id) for update in updates]
+    headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET} if WEBHOOK_SECRET else {}
+    statuses = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(http: aiohttp.ClientSession, update: dict) -> None:
+        async with semaphore:
+            try:
+                async with http.post(url, json=update, headers=headers) as response:
+                    statuses[response.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(post(http, update) for update in updates))
+    elapsed = time.perf_counter() - start
+    print(f"Отправлено {len(updates)} апдейтов за {elapsed:.2f} с ({len(updates) / elapsed:.1f}/с): {dict(statuses)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение апдейтов Telegram")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="сохранить апдейты из getUpdates")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--limit", type=int, default=100)
+    replay_parser = commands.add_parser("replay", help="отправить сохраненные апдейты на webhook")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--url", default=f"http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    replay_parser.add_argument("--concurrency", type=int, default=10)
+    replay_parser.add_argument("--chat-id", type=int, default=None)
+    args = parser.parse_args()
+    if args.command == "record":
+        asyncio.run(record(args.path, args.limit))
+    else:
+        asyncio.run(replay(args.path, args.url, args.concurrency, args.chat_id))
+
+
+if __name__ == "__main__":
+    main()
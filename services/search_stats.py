@@ -0,0 +1,134 @@
+"""
+Module services.search_stats
+
+Heavy hitters of search queries with bounded memory (Space-Saving).
+
+Two sketches are kept: all queries and queries without results. Each holds
+at most ``SEARCH_TOPK_CAPACITY`` queries; a new query replaces the one with
+the smallest count and inherits that count as its error. A periodic job
+swaps the sketches for empty ones and adds the guaranteed counts
+(count - error) to the daily search_query_stats table, so the table only
+gets queries that really were frequent.
+"""
+from datetime import timedelta
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from data.config import SEARCH_TOPK_CAPACITY
+from database.models import SearchQueryStat
+from services.activity_rollups import utc_today
+
+QUERY_MAX_LEN = 100
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())[:QUERY_MAX_LEN]
+
+
+class SpaceSaving:
+    """Top-k счетчик Space-Saving: {элемент: [count, error]} не больше capacity элементов"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._counters: dict[str, list[int]] = {}
+
+    def offer(self, item: str) -> None:
+        counter = self._counters.get(item)
+        if counter is not None:
+            counter[0] += 1
+            return
+        if len(self._counters) < self.capacity:
+            self._counters[item] = [1, 0]
+            return
+        victim = min(self._counters, key=lambda key: self._counters[key][0])
+        count = self._counters.pop(victim)[0]
+        self._counters[item] = [count + 1, count]
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Добавляет счетчики other; при переполнении остаются capacity элементов с наибольшим count"""
+        for item, count, error in other.top():
+            counter = self._counters.setdefault(item, [0, 0])
+            counter[0] += count
+            counter[1] += error
+        if len(self._counters) > self.capacity:
+            self._counters = {item: [count, error] for item, count, error in self.top(self.capacity)}
+
+    def top(self, limit: int | None = None) -> list[tuple[str, int, int]]:
+        """[(элемент, count, error)] по убыванию count"""
+        items = sorted(((item, c[0], c[1]) for item, c in self._counters.items()), key=lambda x: x[1], reverse=True)
+        return items[:limit] if limit else items
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class SearchStats:
+    """Счетчики всех запросов и запросов без результатов"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.queries = SpaceSaving(capacity)
+        self.misses = SpaceSaving(capacity)
+
+    def record(self, query: str, found: bool) -> None:
+        query = normalize_query(query)
+        if not query:
+            return
+        self.queries.offer(query)
+        if not found:
+            self.misses.offer(query)
+
+    def take(self) -> dict[str, SpaceSaving]:
+        """Забирает накопленные счетчики, начиная новый период"""
+        taken = {"query": self.queries, "miss": self.misses}
+        self.queries = SpaceSaving(self.capacity)
+        self.misses = SpaceSaving(self.capacity)
+        return taken
+
+    def restore(self, taken: dict[str, SpaceSaving]) -> None:
+        """Возвращает забранные счетчики в текущий период (после ошибки записи)"""
+        self.queries.merge(taken["query"])
+        self.misses.merge(taken["miss"])
+
+
+search_stats = SearchStats(SEARCH_TOPK_CAPACITY)
+
+
+def store_search_stats(engine: Engine, taken: dict[str, SpaceSaving]) -> None:
+    """Добавляет гарантированные частоты (count - error) к статистике за сегодня"""
+    day = utc_today()
+    rows = [
+        {"day": day, "kind": kind, "query": item, "hits": count - error}
+        for kind, sketch in taken.items()
+        for item, count, error in sketch.top()
+        if count > error
+    ]
+    if not rows:
+        return
+    stmt = insert(SearchQueryStat).values(rows)
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "kind", "query"],
+            set_={"hits": SearchQueryStat.hits + stmt.excluded.hits},
+        ))
+
+
+def top_search_queries(session: Session, kind: str, days: int = 30, limit: int = 15) -> list[tuple[str, int]]:
+    """Самые частые запросы за days дней: сохраненные плюс накопленные в памяти"""
+    since = utc_today() - timedelta(days=days - 1)
+    total = func.sum(SearchQueryStat.hits)
+    totals = dict(session.execute(
+        select(SearchQueryStat.query, total)
+        .where(SearchQueryStat.day >= since, SearchQueryStat.kind == kind)
+        .group_by(SearchQueryStat.query)
+        .order_by(total.desc())
+        .limit(limit * 2)
+    ).all())
+    sketch = search_stats.queries if kind == "query" else search_stats.misses
+    for item, count, error in sketch.top():
+        if count > error:
+            totals[item] = totals.get(item, 0) + count - error
+    return sorted(totals.items(), key=lambda x: x[1], reverse=True)[:limit]
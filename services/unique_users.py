@@ -0,0 +1,119 @@
+"""
+Module services.unique_users
+
+Approximate DAU/WAU/MAU on HyperLogLog sketches (services.hll).
+
+The activity writer adds every event's chat_id to the in-memory sketch of its
+UTC day. A periodic job merges dirty sketches into the activity_hll table
+(one row per day, SELECT ... FOR UPDATE + register-wise max), so several bot
+processes can share the table. Reports merge stored and in-memory sketches -
+merging is idempotent, so nothing is counted twice.
+"""
+from datetime import date, timedelta
+
+from loguru import logger
+from sqlalchemy import select, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from database.models import ActivityHll, ActivityDailyChat
+from services.activity_rollups import utc_today
+from services.hll import HyperLogLog
+
+# Сколько дней держать скетчи в памяти после сохранения
+KEEP_DAYS = 2
+
+
+class UniqueUsersTracker:
+    """Скетчи уникальных чатов по дням в памяти"""
+
+    def __init__(self):
+        self._sketches: dict[date, HyperLogLog] = {}
+        self._dirty: set[date] = set()
+
+    def add(self, day: date, chat_id: int) -> None:
+        sketch = self._sketches.get(day)
+        if sketch is None:
+            sketch = self._sketches[day] = HyperLogLog()
+        sketch.add(chat_id)
+        self._dirty.add(day)
+
+    def sketch(self, day: date) -> HyperLogLog | None:
+        return self._sketches.get(day)
+
+    def mark_dirty(self, days) -> None:
+        """Возвращает дни в очередь сохранения (после ошибки записи)"""
+        self._dirty.update(day for day in days if day in self._sketches)
+
+    def take_dirty(self) -> dict[date, bytes]:
+        """Снимок измененных скетчей для сохранения; старые дни убираются из памяти"""
+        dirty = {day: self._sketches[day].to_bytes() for day in self._dirty}
+        self._dirty.clear()
+        oldest = utc_today() - timedelta(days=KEEP_DAYS)
+        for day in [day for day in self._sketches if day < oldest]:
+            del self._sketches[day]
+        return dirty
+
+
+unique_users = UniqueUsersTracker()
+
+
+def store_sketches(engine: Engine, sketches: dict[date, bytes]) -> None:
+    """Объединяет скетчи с сохраненными в activity_hll"""
+    if not sketches:
+        return
+    with Session(engine) as sess, sess.begin():
+        stored = {row.day: row for row in sess.scalars(
+            select(ActivityHll).where(ActivityHll.day.in_(sketches.keys())).with_for_update())}
+        for day, data in sketches.items():
+            row = stored.get(day)
+            if row is None:
+                sess.add(ActivityHll(day=day, sketch=data))
+            else:
+                merged = HyperLogLog.from_bytes(row.sketch).merge(HyperLogLog.from_bytes(data))
+                row.sketch = merged.to_bytes()
+
+
+def backfill_unique_users(engine: Engine) -> None:
+    """Строит скетчи по activity_daily_chats, если таблица activity_hll пуста"""
+    with Session(engine) as sess:
+        if sess.scalar(select(func.count()).select_from(ActivityHll)):
+            return
+        sketches: dict[date, HyperLogLog] = {}
+        rows = sess.execute(select(ActivityDailyChat.day, ActivityDailyChat.chat_id).execution_options(yield_per=5000))
+        for day, chat_id in rows:
+            sketches.setdefault(day, HyperLogLog()).add(chat_id)
+    store_sketches(engine, {day: sketch.to_bytes() for day, sketch in sketches.items()})
+    if sketches:
+        logger.info(f"Построены HyperLogLog скетчи уникальных пользователей за {len(sketches)} дн.")
+
+
+def load_sketches(session: Session, since: date, until: date) -> dict[date, HyperLogLog]:
+    """Скетчи за дни [since, until]: сохраненные, объединенные с данными в памяти"""
+    sketches = {day: HyperLogLog.from_bytes(data) for day, data in session.execute(
+        select(ActivityHll.day, ActivityHll.sketch).where(ActivityHll.day.between(since, until)))}
+    day = since
+    while day <= until:
+        in_memory = unique_users.sketch(day)
+        if in_memory is not None:
+            sketches[day] = sketches[day].merge(in_memory) if day in sketches else HyperLogLog.union([in_memory])
+        day += timedelta(days=1)
+    return sketches
+
+
+def count_unique(sketches: dict[date, HyperLogLog], since: date, until: date) -> int:
+    """Уникальные пользователи за диапазон дней"""
+    selected = [sketch for day, sketch in sketches.items() if since <= day <= until]
+    return HyperLogLog.union(selected).count() if selected else 0
+
+
+def unique_users_report(session: Session) -> dict:
+    """DAU за последние 7 дней, WAU и MAU (скользящие 7 и 30 дней по UTC)"""
+    today = utc_today()
+    sketches = load_sketches(session, today - timedelta(days=29), today)
+    return {
+        "daily": [(today - timedelta(days=i), count_unique(sketches, today - timedelta(days=i), today - timedelta(days=i)))
+                  for i in range(7)],
+        "wau": count_unique(sketches, today - timedelta(days=6), today),
+        "mau": count_unique(sketches, today - timedelta(days=29), today),
+    }
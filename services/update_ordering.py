@@ -0,0 +1,75 @@
+"""
+Module services.update_ordering
+
+Concurrent update processing with per-chat ordering.
+
+Polling (handle_as_tasks) and webhook (handle_in_background) run every
+update in its own task. ChatOrderingIsolation is passed to the Dispatcher
+as ``events_isolation``: aiogram's FSMContextMiddleware enters ``lock(key)``
+before loading the FSM state and holds it while the handler runs. Updates of
+one chat wait in a FIFO asyncio.Lock, so FSM flows see their updates in
+order, while different chats run concurrently, at most UPDATE_CONCURRENCY at
+a time (the global semaphore is taken after the chat lock, so a busy chat
+does not hold slots of others).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+from services.metrics import Gauge, Histogram
+
+QUEUE_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 50)
+
+updates_waiting = Gauge("shefport_updates_waiting", "Updates waiting for their chat lock or a concurrency slot")
+updates_running = Gauge("shefport_updates_running", "Updates holding a concurrency slot")
+chat_queue_depth = Histogram("shefport_chat_queue_depth", "Updates of the same chat queued on arrival",
+                             buckets=QUEUE_BUCKETS)
+
+
+class ChatQueue:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class ChatOrderingIsolation(BaseEventIsolation):
+    """Очередь на чат + общий семафор параллельности"""
+
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queues: dict[tuple, ChatQueue] = {}
+        Gauge("shefport_chat_queues", "Chats with updates in progress", func=lambda: len(self._queues))
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        # Порядок нужен в пределах чата, а не пары чат-пользователь
+        name = (key.bot_id, key.chat_id, key.thread_id)
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = self._queues[name] = ChatQueue()
+        queue.depth += 1
+        chat_queue_depth.observe(queue.depth)
+        updates_waiting.inc()
+        waiting = True
+        try:
+            async with queue.lock, self._semaphore:
+                updates_waiting.dec()
+                waiting = False
+                updates_running.inc()
+                try:
+                    yield
+                finally:
+                    updates_running.dec()
+        finally:
+            if waiting:
+                updates_waiting.dec()
+            queue.depth -= 1
+            if queue.depth == 0:
+                self._queues.pop(name, None)
+
+    async def close(self) -> None:
+        self._queues.clear()
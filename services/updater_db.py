@@ -9,12 +9,12 @@ Functions:
         Loads report from file and returns DataFrame.
 
 """
-import json
-
 import pandas as pd
 from loguru import logger
 from sqlalchemy import select
 from sqlalchemy.orm import Session
+from database.db import parse_json_field
+from services.invalidation import notify_invalidation
 from database.models import Product, Category  # твоя модель
 
 
@@ -58,17 +58,18 @@ def update_notfound_to_bd(df, session):
             article=str(row.get("Код")),
             description=row.get("Описание", "Отсутствует описание"),
             full_description=row.get("Описание", "Отсутствует описание"),
-            characteristics=json.dumps(row.get("Характеристики")) if row.get("Характеристики") else None,
+            characteristics=parse_json_field(row.get("Характеристики")),
             main_image=row.get(""),
-            additional_images=json.dumps(row.get("Доп. изображения")) if row.get("Доп. изображения") else None,
+            additional_images=parse_json_field(row.get("Доп. изображения")),
             weight=row.get("Вес"),
             calories=row.get("Калории"),
-            nutrition_facts=json.dumps(row.get("Пищевая ценность")) if row.get("Пищевая ценность") else None,
+            nutrition_facts=parse_json_field(row.get("Пищевая ценность")),
             ostatok=row.get("Количество", 0)
             )
         products.append(product)
 
     session.add_all(products)
+    notify_invalidation(session, "product")
     session.commit()
     logger.info(f"В БД добавлено {len(products)} товаров")
     return len(products)
@@ -99,6 +100,7 @@ def update_products_from_df(df: pd.DataFrame, session: Session):
         count += 1
 
     # сохраняем изменения в БД
+    notify_invalidation(session, "product")
     session.commit()
     logger.info(f"В БД обновлено {count} товаров")
 
@@ -0,0 +1,94 @@
+"""
+Module services.user_store
+
+Bounded per-user key/value stores with TTL for handler bookkeeping
+(message ids to delete later, search results, opened descriptions).
+
+By default values live in an in-process LRU of at most ``max_users`` users,
+and entries expire ``ttl`` seconds after the last write. After
+``configure_user_stores`` with a shared (non-memory) FSM storage, values are
+kept in that storage under the destiny ``store_<name>`` instead, so they
+survive restarts and are visible to every bot process. Values must be
+JSON-serialisable.
+"""
+import time
+from collections import OrderedDict
+from typing import Any
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from data.config import USER_STORE_TTL, USER_STORE_MAX
+
+_shared_storage: BaseStorage | None = None
+_bot_id: int | None = None
+
+
+def configure_user_stores(storage: BaseStorage, bot_id: int) -> None:
+    """Включает хранение в общем FSM storage (MemoryStorage игнорируется)"""
+    global _shared_storage, _bot_id
+    if isinstance(storage, MemoryStorage):
+        return
+    _shared_storage = storage
+    _bot_id = bot_id
+
+
+class UserStore:
+    """Значение на пользователя с TTL и ограничением числа пользователей"""
+
+    def __init__(self, name: str, ttl: int = USER_STORE_TTL, max_users: int = USER_STORE_MAX):
+        self.name = name
+        self.ttl = ttl
+        self.max_users = max_users
+        self._items: OrderedDict[int, tuple[float, Any]] = OrderedDict()
+
+    def _key(self, user_id: int) -> StorageKey:
+        return StorageKey(bot_id=_bot_id, chat_id=user_id, user_id=user_id, destiny=f"store_{self.name}")
+
+    async def get(self, user_id: int, default: Any = None) -> Any:
+        if _shared_storage is not None:
+            data = await _shared_storage.get_data(self._key(user_id))
+            if not data or data.get("expires", 0) < time.time():
+                return default
+            return data["value"]
+        entry = self._items.get(user_id)
+        if entry is None:
+            return default
+        if entry[0] < time.monotonic():
+            del self._items[user_id]
+            return default
+        self._items.move_to_end(user_id)
+        return entry[1]
+
+    async def set(self, user_id: int, value: Any) -> None:
+        if _shared_storage is not None:
+            await _shared_storage.set_data(self._key(user_id), {"value": value, "expires": time.time() + self.ttl})
+            return
+        self._items[user_id] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(user_id)
+        self._evict()
+
+    async def pop(self, user_id: int, default: Any = None) -> Any:
+        value = await self.get(user_id, default)
+        if _shared_storage is not None:
+            await _shared_storage.set_data(self._key(user_id), {})
+        else:
+            self._items.pop(user_id, None)
+        return value
+
+    async def append(self, user_id: int, *items) -> None:
+        """Добавляет элементы к списку пользователя"""
+        values = await self.get(user_id) or []
+        values.extend(items)
+        await self.set(user_id, values)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._items:
+            user_id, (expires, _) = next(iter(self._items.items()))
+            if expires >= now and len(self._items) <= self.max_users:
+                break
+            del self._items[user_id]
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,50 @@
+"""
+Module services.webhook
+
+Webhook delivery of updates: an aiohttp application with aiogram's
+SimpleRequestHandler on WEBHOOK_PATH.
+
+Several bot processes bind the same WEBHOOK_HOST:WEBHOOK_PORT with
+SO_REUSEPORT and the kernel spreads incoming connections between them; a local
+reverse proxy (nginx, caddy) terminates TLS for WEBHOOK_BASE_URL and forwards
+to that port. Only the primary process calls setWebhook. Updates can be
+replayed locally with ``python -m services.replay_updates``.
+"""
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+
+from data.config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+
+
+def build_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher) -> None:
+    if not WEBHOOK_BASE_URL:
+        logger.warning("WEBHOOK_BASE_URL не задан, webhook в Telegram не установлен (локальный режим)")
+        return
+    url = WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH
+    await bot.set_webhook(url, secret_token=WEBHOOK_SECRET, allowed_updates=dp.resolve_used_update_types())
+    logger.info(f"Webhook установлен на {url}")
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, primary: bool = True) -> None:
+    """Serves updates on WEBHOOK_HOST:WEBHOOK_PORT until cancelled"""
+    runner = web.AppRunner(build_webhook_app(bot, dp), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=True).start()
+    logger.info(f"Webhook сервер слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    if primary:
+        await set_webhook(bot, dp)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
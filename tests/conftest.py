@@ -0,0 +1,15 @@
+import sys
+import types
+
+
+class _OfflineDb(types.ModuleType):
+    """database.db без подключения: модуль подключается к Postgres при импорте,
+    а тесты передают свой engine/session явно"""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return None
+
+
+sys.modules.setdefault("database.db", _OfflineDb("database.db"))
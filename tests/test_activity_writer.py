@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from services.activity_writer import ActivityWriter
+
+
+class RecordingWriter(ActivityWriter):
+    """ActivityWriter, который вместо INSERT запоминает строки"""
+
+    def __init__(self, *args, insert_delay: float = 0.0, **kwargs):
+        super().__init__(None, *args, **kwargs)
+        self.inserted: list[dict] = []
+        self.insert_delay = insert_delay
+
+    def _insert(self, rows: list[dict]) -> None:
+        time.sleep(self.insert_delay)
+        self.inserted.extend(rows)
+
+
+def test_stop_flushes_batch_being_collected():
+    async def scenario():
+        writer = RecordingWriter(batch_size=100, flush_interval_ms=60_000, max_queue=1000)
+        await writer.start()
+        for chat_id in range(10):
+            writer.record(chat_id, "message", "text")
+        await asyncio.sleep(0.05)  # _run забрал строки из очереди и ждет остальные
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert sorted(row["chat_id"] for row in writer.inserted) == list(range(10))
+
+
+def test_stop_waits_for_batch_being_written():
+    async def scenario():
+        writer = RecordingWriter(batch_size=5, flush_interval_ms=60_000, max_queue=1000, insert_delay=0.2)
+        await writer.start()
+        for chat_id in range(12):
+            writer.record(chat_id, "callback_query", f"add_to_cart_{chat_id}")
+        await asyncio.sleep(0.05)  # первая порция пишется в потоке
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert sorted(row["chat_id"] for row in writer.inserted) == list(range(12))
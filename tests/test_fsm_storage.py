@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from services import fsm_storage
+from services.fsm_storage import PostgresStorage, cleanup_expired_fsm
+
+
+class Itemscount(StatesGroup):
+    waiting = State()
+
+
+class TableStorage(PostgresStorage):
+    """PostgresStorage, у которого строки fsm_storage лежат в dict, с той же логикой, что и SQL"""
+
+    def __init__(self, ttl: int | None = None):
+        super().__init__(None, ttl=ttl)
+        self.rows: dict[str, dict] = {}
+
+    def _is_expired(self, row: dict) -> bool:
+        return row["expires_at"] is not None and row["expires_at"] <= datetime.now(timezone.utc)
+
+    def _upsert(self, key: str, **values) -> None:
+        row = self.rows.get(key)
+        if row is None or self._is_expired(row):
+            row = {"state": None, "data": {}}
+        self.rows[key] = {**row, **values, "expires_at": self._expires_at()}
+
+    def _get(self, key: str, column):
+        row = self.rows.get(key)
+        if row is None or self._is_expired(row):
+            return None
+        return row[column.key]
+
+    def _merge_data(self, key: str, patch: dict) -> dict:
+        row = self.rows.get(key)
+        if row is None or self._is_expired(row):
+            row = {"state": None, "data": {}}
+        self.rows[key] = {**row, "data": {**row["data"], **patch}, "expires_at": self._expires_at()}
+        return self.rows[key]["data"]
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_state_and_data_are_kept_separately():
+    async def scenario():
+        storage = TableStorage(ttl=3600)
+        await storage.set_state(KEY, Itemscount.waiting)
+        await storage.set_data(KEY, {"product_id": 5})
+        await storage.update_data(KEY, {"quantity": 2})
+        return storage, await storage.get_state(KEY), await storage.get_data(KEY)
+
+    storage, state, data = asyncio.run(scenario())
+    assert state == Itemscount.waiting.state
+    assert data == {"product_id": 5, "quantity": 2}
+    assert list(storage.rows) == [storage.key_builder.build(KEY)]
+
+
+def test_expired_record_is_invisible_and_reset_on_write():
+    async def scenario():
+        storage = TableStorage(ttl=3600)
+        await storage.set_state(KEY, Itemscount.waiting)
+        await storage.set_data(KEY, {"product_id": 5})
+        row = storage.rows[storage.key_builder.build(KEY)]
+        row["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        expired = await storage.get_state(KEY), await storage.get_data(KEY)
+        await storage.set_state(KEY, Itemscount.waiting)
+        return expired, await storage.get_data(KEY)
+
+    (state, data), data_after_write = asyncio.run(scenario())
+    assert state is None and data == {}
+    assert data_after_write == {}
+
+
+def test_write_moves_expiry_forward_by_ttl():
+    async def scenario():
+        storage = TableStorage(ttl=60)
+        await storage.set_state(KEY, Itemscount.waiting)
+        return storage.rows[storage.key_builder.build(KEY)]["expires_at"]
+
+    expires_at = asyncio.run(scenario())
+    left = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    assert 55 < left <= 60
+
+
+def test_without_ttl_records_do_not_expire():
+    async def scenario():
+        storage = TableStorage()
+        await storage.set_data(KEY, {"query": "сыр"})
+        return storage.rows[storage.key_builder.build(KEY)]["expires_at"], await storage.get_data(KEY)
+
+    expires_at, data = asyncio.run(scenario())
+    assert expires_at is None
+    assert data == {"query": "сыр"}
+
+
+def test_cleanup_deletes_in_batches_until_short_batch(monkeypatch):
+    expired = 2503
+    calls = []
+
+    def delete_batch(engine, batch):
+        nonlocal expired
+        calls.append(batch)
+        count = min(batch, expired)
+        expired -= count
+        return count
+
+    monkeypatch.setattr(fsm_storage, "_delete_expired_batch", delete_batch)
+    assert cleanup_expired_fsm(None, batch=1000) == 2503
+    assert calls == [1000, 1000, 1000]
+
+
+def test_cleanup_stops_after_empty_batch(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fsm_storage, "_delete_expired_batch", lambda engine, batch: calls.append(batch) or 0)
+    assert cleanup_expired_fsm(None) == 0
+    assert calls == [fsm_storage.CLEANUP_BATCH]
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+
+from services import image_prewarm
+
+
+class FakeChecker:
+    def __init__(self):
+        self.broken: list[str] = []
+
+    async def is_ok(self, url: str) -> bool:
+        return True
+
+    async def mark_broken(self, url: str) -> None:
+        self.broken.append(url)
+
+
+class FakeBot:
+    """send_photo отвечает ошибкой error для каждой ссылки"""
+
+    def __init__(self, error: str):
+        self.error = error
+        self.sent: list[str] = []
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.sent.append(photo)
+        raise TelegramBadRequest(SendPhoto(chat_id=chat_id, photo=photo), self.error)
+
+
+@pytest.fixture
+def checker(monkeypatch):
+    checker = FakeChecker()
+    products = [(1, "https://shop/1.jpg"), (2, "https://shop/2.jpg"), (3, "https://shop/3.jpg")]
+    monkeypatch.setattr(image_prewarm, "image_checker", checker)
+    monkeypatch.setattr(image_prewarm, "products_to_prewarm", lambda engine, limit: products[:limit])
+    monkeypatch.setattr(image_prewarm, "product_images", SimpleNamespace())
+    return checker
+
+
+def test_chat_error_stops_run_without_marking_links(checker):
+    bot = FakeBot("Bad Request: chat not found")
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(image_prewarm.prewarm_images(bot, -100, rate=1000, batch=10))
+    assert bot.sent == ["https://shop/1.jpg"]
+    assert checker.broken == []
+
+
+def test_rejected_image_is_marked_broken(checker):
+    bot = FakeBot("Bad Request: wrong type of the web page content")
+    uploaded = asyncio.run(image_prewarm.prewarm_images(bot, -100, rate=1000, batch=10))
+    assert uploaded == 0
+    assert checker.broken == ["https://shop/1.jpg", "https://shop/2.jpg", "https://shop/3.jpg"]
@@ -0,0 +1,13 @@
+from handlers.products import characteristics_text
+
+
+def test_characteristics_from_dict():
+    assert characteristics_text({"Вес": "1 кг", "Страна": "Россия"}) == "\n Вес - 1 кг\n Страна - Россия"
+
+
+def test_characteristics_legacy_string_shown_as_is():
+    assert characteristics_text("Вес 1 кг; Страна: Россия") == "\n Вес 1 кг; Страна: Россия"
+
+
+def test_characteristics_list_and_markup():
+    assert characteristics_text(["Вес 1 кг", "<без глютена>"]) == "\n Вес 1 кг\n &lt;без глютена&gt;"
@@ -0,0 +1,18 @@
+"""
+Utility functions for callback data.
+"""
+
+
+def callback_prefix(data):
+    """Action prefix of callback data without ids and flags, e.g.
+    'add_to_cart_15' -> 'add_to_cart', 'CartItem_plus:7' -> 'CartItem_plus',
+    'catalog_continue_3_10_True' -> 'catalog_continue'."""
+    if not data:
+        return "none"
+    head = data.split(":", 1)[0]
+    parts = []
+    for part in head.split("_"):
+        if not part or part.lstrip("-").isdigit() or part in ("True", "False"):
+            break
+        parts.append(part)
+    return "_".join(parts)[:64] or "none"
@@ -0,0 +1,84 @@
+"""
+Token bucket rate limiting.
+
+A bucket holds up to ``burst`` tokens and refills at ``rate`` tokens per
+second; an action is allowed while a token is available. Buckets keyed by
+user or chat live in a bounded LRU so memory does not grow with the number
+of users.
+"""
+import time
+from collections import OrderedDict
+
+
+def parse_rate(value: str) -> tuple[float, float]:
+    """'rate/burst' -> (rate, burst), например '3/6' - 3 в секунду, не больше 6 подряд"""
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+def parse_rules(value: str) -> dict[str, tuple[float, float]]:
+    """'CartItem_plus=4/8,catalog_continue=1/3' -> {prefix: (rate, burst)}"""
+    rules = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        prefix, _, rate = item.partition("=")
+        rules[prefix.strip()] = parse_rate(rate.strip())
+    return rules
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, tokens: float | None = None, updated: float | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst if tokens is None else tokens
+        self.updated = time.monotonic() if updated is None else updated
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def consume(self, tokens: float = 1.0, now: float | None = None) -> bool:
+        """Списывает tokens, если они есть; иначе возвращает False"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1.0) -> float:
+        """Через сколько секунд будет доступно tokens токенов.
+        updated в будущем - корзина на паузе, токены начнут копиться только после нее"""
+        now = time.monotonic()
+        self._refill(now)
+        missing = tokens - self.tokens
+        paused = max(0.0, self.updated - now)
+        return paused + max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+class BucketRegistry:
+    """LRU из не более max_size корзин с одинаковыми параметрами"""
+
+    def __init__(self, rate: float, burst: float, max_size: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_size = max_size
+        self._buckets: OrderedDict = OrderedDict()
+
+    def get(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def consume(self, key, tokens: float = 1.0) -> bool:
+        return self.get(key).consume(tokens)
+
+    def __len__(self) -> int:
+        return len(self._buckets)